@@ -0,0 +1,75 @@
+import os
+import json
+import tempfile
+from contextlib import contextmanager
+
+# Define app name which used as folder name
+APP_NAME = "GSF"
+
+# user-specific data dir shared by the manager, the service, the gadgets and the command line tools
+APP_DATA_PATH = os.path.join(os.getenv('APPDATA', os.path.expanduser('~')), APP_NAME)
+CONFIG_DIR = os.path.join(APP_DATA_PATH, 'config')
+
+
+def read_json(path, default=None):
+    """Return: the decoded file, default when it is missing or half written"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def write_bytes_atomic(path, data):
+    """
+    readers see the old or the new file, never a partial one; the temp file name is
+    unique so several processes may write the same file
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def write_json_atomic(path, data, indent=4):
+    write_bytes_atomic(path, json.dumps(data, indent=indent).encode('utf-8'))
+
+
+@contextmanager
+def file_lock(path):
+    """
+    exclusive lock between processes around a read-modify-write of path,
+    held on the side file <path>.lock
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.lock', 'a+b') as f:
+        if os.name == 'nt':
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass  # LK_LOCK gave up after 10 s, keep waiting
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,87 @@
+import os
+import mmap
+import struct
+import zipfile
+import posixpath
+
+MANIFEST_FILE = 'gadget.json'
+
+# local file header layout, see zipfile.structFileHeader
+_LOCAL_HEADER = struct.Struct('<4s2B4HL2L2H')
+_LH_FILENAME_LENGTH = 10
+_LH_EXTRA_FIELD_LENGTH = 11
+
+
+def is_archive_gadget(gadget_path):
+    """a gadget installed as its .zip package instead of an extracted folder"""
+    return gadget_path.lower().endswith('.zip') and os.path.isfile(gadget_path)
+
+
+def archive_settings_file(gadget_path):
+    """the archive is read-only, its config.ini live next to it"""
+    return os.path.splitext(gadget_path)[0] + '.config.ini'
+
+
+def find_archive_root(names):
+    """
+    Return: the folder prefix holding gadget.json ('' or 'name/'), None if there is no manifest
+    """
+    if MANIFEST_FILE in names:
+        return ''
+    for name in names:
+        if name.count('/') == 1 and name.endswith('/' + MANIFEST_FILE):
+            return name[:-len(MANIFEST_FILE)]
+    return None
+
+
+class GadgetArchive:
+    """
+    read-only access to a gadget package through a memory-mapped file,
+    only the central directory is parsed on open, members are read on demand
+    """
+    def __init__(self, archive_path):
+        self.archive_path = archive_path
+        self._file = open(archive_path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._zip = zipfile.ZipFile(self._mmap, 'r')
+        except Exception:
+            self._file.close()
+            raise
+        self.names = set(self._zip.namelist())
+        self.root = find_archive_root(self.names)
+        if self.root is None:
+            self.close()
+            raise FileNotFoundError(f"{MANIFEST_FILE} not found in {archive_path}")
+
+    def _member(self, relpath):
+        name = posixpath.normpath(self.root + relpath.replace('\\', '/'))
+        if name.startswith('../') or name not in self.names:
+            raise FileNotFoundError(f"'{relpath}' not found in {self.archive_path}")
+        return self._zip.getinfo(name)
+
+    def read(self, relpath):
+        """
+        Return: the member content, stored (uncompressed) members are returned as a
+        zero-copy memoryview over the mapped archive, compressed ones as bytes
+        """
+        info = self._member(relpath)
+        if info.compress_type != zipfile.ZIP_STORED or info.flag_bits & 0x1:
+            return self._zip.read(info)
+        header = _LOCAL_HEADER.unpack_from(self._mmap, info.header_offset)
+        offset = (info.header_offset + _LOCAL_HEADER.size
+                  + header[_LH_FILENAME_LENGTH] + header[_LH_EXTRA_FIELD_LENGTH])
+        return memoryview(self._mmap)[offset:offset + info.file_size]
+
+    def close(self):
+        """raise BufferError while memoryviews returned by read() are alive, the file is closed anyway"""
+        self._zip.close()
+        self._file.close()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
@@ -0,0 +1,169 @@
+import os
+import mmap
+import uuid
+import struct
+import hashlib
+from collections import OrderedDict
+
+from gsf.appdata import APP_DATA_PATH
+
+# one file per decoded asset, <sha256 of the encoded data>-<pixel format>.px
+# every process maps the same file, so the decoded pixels are in memory once
+ASSET_CACHE_DIR = os.path.join(APP_DATA_PATH, 'asset_cache')
+SEGMENT_SUFFIX = '.px'
+DEFAULT_BUDGET_BYTES = 256 * 1024 * 1024
+
+# magic, width, height, bytes per line, pixel format (QImage.Format value)
+_HEADER = struct.Struct('<4sIIII')
+_MAGIC = b'GSFA'
+# pixels start on a cache line
+_PIXELS_OFFSET = 64
+
+
+class SharedAsset:
+    """decoded pixels of one asset, mapped read-only from its segment file"""
+    def __init__(self, key, path):
+        self.key = key
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.width, self.height, self.bytes_per_line, self.format = _HEADER.unpack_from(self._mmap, 0)
+        if magic != _MAGIC or len(self._mmap) < _PIXELS_OFFSET + self.bytes_per_line * self.height:
+            self._mmap.close()
+            raise ValueError(f"Corrupted asset segment {path}")
+        self.pixels = memoryview(self._mmap)[_PIXELS_OFFSET:_PIXELS_OFFSET + self.bytes_per_line * self.height]
+        self.size = len(self._mmap)
+
+    def close(self):
+        try:
+            self.pixels.release()
+            self._mmap.close()
+        except BufferError:
+            # still wrapped by a live image, unmapped when it is garbage collected
+            pass
+
+
+def _write_segment(path, width, height, bytes_per_line, pixel_format, pixels):
+    # unique temp name, two processes may decode the same asset at the same time
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, width, height, bytes_per_line, pixel_format).ljust(_PIXELS_OFFSET, b'\0'))
+        f.write(pixels)
+    os.replace(tmp_path, path)
+
+
+class AssetCache:
+    """
+    decoded assets shared by all the gadget processes through memory-mapped segment files
+    keyed by the content hash, so the same image shipped by several gadgets is decoded once
+    acquire() count references, a segment is unmapped with its last one; when the segments
+    take more than budget_bytes the least recently used ones are deleted (windows refuse to
+    delete the ones still mapped by another process, they are kept)
+    """
+    def __init__(self, cache_dir=ASSET_CACHE_DIR, budget_bytes=DEFAULT_BUDGET_BYTES):
+        self.cache_dir = cache_dir
+        self.budget_bytes = budget_bytes
+        self.mapped = OrderedDict()  # { key: SharedAsset }, least recently used first
+        self.refs = {}               # { key: references in this process }
+        self.decoded = 0             # segments decoded by this process, the others were reused
+
+    def segment_path(self, key):
+        return os.path.join(self.cache_dir, key + SEGMENT_SUFFIX)
+
+    def acquire(self, data, decode, pixel_format=0):
+        """
+        data: the encoded asset (bytes or memoryview)
+        decode: callable(data) -> (width, height, bytes per line, pixels buffer), only called
+        when no process decoded this content in this pixel_format before
+        Return: SharedAsset, to give back with release()
+        """
+        key = f"{hashlib.sha256(data).hexdigest()}-{pixel_format}"
+        asset = self.mapped.get(key)
+        if asset is None:
+            path = self.segment_path(key)
+            try:
+                asset = SharedAsset(key, path)
+            except (OSError, ValueError):
+                width, height, bytes_per_line, pixels = decode(data)
+                os.makedirs(self.cache_dir, exist_ok=True)
+                _write_segment(path, width, height, bytes_per_line, pixel_format, pixels)
+                self.decoded += 1
+                asset = SharedAsset(key, path)
+            self.mapped[key] = asset
+            self.evict()
+        self.mapped.move_to_end(key)
+        self.refs[key] = self.refs.get(key, 0) + 1
+        try:
+            # the mtime is the last use, shared by every process for the LRU
+            os.utime(asset.path)
+        except OSError:
+            pass
+        return asset
+
+    def release(self, asset):
+        refs = self.refs.get(asset.key, 0) - 1
+        if refs > 0:
+            self.refs[asset.key] = refs
+            return
+        self.refs.pop(asset.key, None)
+        if self.mapped.pop(asset.key, None) is not None:
+            asset.close()
+
+    def _segments(self):
+        """Return: [(mtime, size, path), ...] of every segment, least recently used first"""
+        segments = []
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return segments
+        for name in names:
+            if not name.endswith(SEGMENT_SUFFIX):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            segments.append((st.st_mtime_ns, st.st_size, path))
+        segments.sort()
+        return segments
+
+    def evict(self):
+        """Return: bytes freed"""
+        segments = self._segments()
+        total = sum(size for _, size, _ in segments)
+        in_use = {asset.path for asset in self.mapped.values()}
+        freed = 0
+        for _, size, path in segments:
+            if total - freed <= self.budget_bytes:
+                break
+            if path in in_use:
+                continue
+            try:
+                os.remove(path)
+                freed += size
+            except OSError:
+                pass # mapped by another process
+        return freed
+
+    def stats(self):
+        segments = self._segments()
+        return {
+            'segments': len(segments),
+            'bytes': sum(size for _, size, _ in segments),
+            'budget_bytes': self.budget_bytes,
+            'mapped': len(self.mapped),
+            'mapped_bytes': sum(asset.size for asset in self.mapped.values()),
+            'decoded': self.decoded,
+        }
+
+
+_shared_cache = None
+
+
+def get_asset_cache():
+    """the cache of this process, shared by all its gadgets (e.g. in the desktop layer host)"""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = AssetCache()
+    return _shared_cache
@@ -0,0 +1,286 @@
+import os
+import sys
+import stat
+import shutil
+import hashlib
+import argparse
+from contextlib import contextmanager
+
+from gsf.appdata import APP_DATA_PATH, read_json, write_json_atomic, file_lock
+
+BLOBS_DIR = os.path.join(APP_DATA_PATH, 'blobs')
+INDEX_FILE_NAME = 'index.json'
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# kept as private copies: the manifest may be edited by hand, bytecode is path specific
+PRIVATE_FILES = {'gadget.json'}
+PRIVATE_DIRS = {'__pycache__'}
+
+# owners of the files of a prepared update, staged in <gadgets dir>/.update-XXXX/<gadget id>
+UPDATE_OWNER_PREFIX = '.update-'
+
+# linux ioctl to share the extents of a file (btrfs, xfs)
+FICLONE = 0x40049409
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _reflink(source, dest):
+    import fcntl
+    with open(source, 'rb') as src, open(dest, 'wb') as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def _make_read_only(path):
+    mode = os.stat(path).st_mode
+    os.chmod(path, mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+
+
+def remove_tree(path):
+    """rmtree which also remove the read-only blob links (windows refuse to delete them)"""
+    def on_exc(func, failed_path, exc):
+        os.chmod(failed_path, stat.S_IWRITE)
+        func(failed_path)
+    if sys.version_info >= (3, 12):
+        shutil.rmtree(path, onexc=on_exc)
+    else:
+        shutil.rmtree(path, onerror=lambda func, failed_path, exc_info: on_exc(func, failed_path, exc_info[1]))
+
+
+class BlobStore:
+    """
+    content-addressed store of gadget files (sha256 -> file),
+    installed gadgets are materialized from it with hardlinks (or reflinks, or copies)
+    every linked file count as one reference, a blob is freed with its last reference
+    the tray, the service and gsf-install share the index: every change is made in a
+    transaction, on the index as the other processes left it
+    """
+    def __init__(self, blobs_dir=BLOBS_DIR):
+        self.blobs_dir = blobs_dir
+        self.index_file = os.path.join(blobs_dir, INDEX_FILE_NAME)
+        self.blobs = {}    # { 'sha256': {'size': int, 'refs': int} }
+        self.gadgets = {}  # { 'gadget_id': ['sha256', ...] }, one entry per linked file
+        self.load()
+
+    def load(self):
+        index = read_json(self.index_file) or {}
+        self.blobs = index.get('blobs', {})
+        self.gadgets = index.get('gadgets', {})
+
+    def save(self):
+        write_json_atomic(self.index_file, {'blobs': self.blobs, 'gadgets': self.gadgets}, indent=None)
+
+    @contextmanager
+    def transaction(self):
+        """hold the index lock, reload the index and save it when the block succeed"""
+        with file_lock(self.index_file):
+            self.load()
+            yield
+            self.save()
+
+    def blob_path(self, digest):
+        return os.path.join(self.blobs_dir, digest[:2], digest)
+
+    def _store(self, path):
+        """
+        move a file into the store (or drop it when the content is already there)
+        Return: (digest, True if path is already a link to the blob and was kept)
+        """
+        digest = hash_file(path)
+        blob = self.blob_path(digest)
+        linked = False
+        if os.path.exists(blob):
+            # e.g. the unchanged files of an update, hardlinked from the installed gadget
+            linked = os.path.samefile(path, blob)
+            if not linked:
+                # the blob links are read-only, windows refuse to delete them otherwise
+                os.chmod(path, stat.S_IWRITE)
+                os.remove(path)
+        else:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            shutil.move(path, blob)
+            # shared by every link, nobody may modify it in place
+            _make_read_only(blob)
+        if digest not in self.blobs:
+            self.blobs[digest] = {'size': os.path.getsize(blob), 'refs': 0}
+        return digest, linked
+
+    def _materialize(self, digest, dest):
+        blob = self.blob_path(digest)
+        try:
+            os.link(blob, dest)
+            return 'hardlink'
+        except OSError:
+            pass
+        try:
+            _reflink(blob, dest)
+            return 'reflink'
+        except (OSError, ImportError):
+            if os.path.exists(dest):
+                os.remove(dest)
+        shutil.copyfile(blob, dest)
+        return 'copy'
+
+    def import_tree(self, gadget_id, gadget_path):
+        """
+        replace every file of an extracted gadget by a link to its blob
+        Return: {'files': int, 'deduplicated_bytes': int, 'modes': {'hardlink': n, ...}}
+        """
+        with self.transaction():
+            if gadget_id in self.gadgets:
+                raise ValueError(f"Gadget {gadget_id} is already in the blob store")
+
+            digests = []
+            report = {'files': 0, 'deduplicated_bytes': 0, 'modes': {}}
+            try:
+                for root, dirs, files in os.walk(gadget_path):
+                    dirs[:] = [d for d in dirs if d not in PRIVATE_DIRS]
+                    for name in files:
+                        if root == gadget_path and name in PRIVATE_FILES:
+                            continue
+                        path = os.path.join(root, name)
+                        digest, linked = self._store(path)
+                        if self.blobs[digest]['refs']:
+                            report['deduplicated_bytes'] += self.blobs[digest]['size']
+                        # counted before the link, so a failure below give it back
+                        self.blobs[digest]['refs'] += 1
+                        digests.append(digest)
+                        mode = 'hardlink' if linked else self._materialize(digest, path)
+                        report['files'] += 1
+                        report['modes'][mode] = report['modes'].get(mode, 0) + 1
+            except BaseException:
+                # the gadget is not recorded, the caller drop its staged files
+                self._drop_refs(digests)
+                self.save()
+                raise
+            self.gadgets[gadget_id] = digests
+        return report
+
+    def release(self, gadget_id):
+        """
+        drop the references of an uninstalled gadget, free the blobs nobody use anymore
+        Return: bytes freed
+        """
+        with self.transaction():
+            return self._drop_refs(self.gadgets.pop(gadget_id, []))
+
+    def _drop_refs(self, digests):
+        """Return: bytes freed by the blobs left without reference"""
+        freed = 0
+        for digest in digests:
+            blob_info = self.blobs.get(digest)
+            if not blob_info:
+                continue
+            blob_info['refs'] -= 1
+            blob = self.blob_path(digest)
+            if blob_info['refs'] <= 0:
+                freed += self._remove_blob(digest)
+            elif os.path.exists(blob):
+                # remove_tree may had to clear the read-only flag, which is shared by the links
+                _make_read_only(blob)
+        return freed
+
+    def transfer(self, from_id, to_id):
+        """
+        hand the references of from_id (an update being swapped in) over to to_id,
+        the previous references of to_id are released
+        Return: bytes freed
+        """
+        with self.transaction():
+            digests = self.gadgets.pop(from_id, [])
+            freed = self._drop_refs(self.gadgets.pop(to_id, []))
+            self.gadgets[to_id] = digests
+        return freed
+
+    def _remove_blob(self, digest):
+        blob = self.blob_path(digest)
+        size = self.blobs.pop(digest, {}).get('size', 0)
+        if os.path.exists(blob):
+            os.chmod(blob, stat.S_IWRITE)
+            os.remove(blob)
+        return size
+
+    def gc(self, gadgets_dir):
+        """
+        forget gadgets removed behind our back, recount the references
+        and delete unreferenced or unknown blobs
+        Return: bytes freed
+        """
+        with self.transaction():
+            staged = set()
+            if os.path.isdir(gadgets_dir):
+                for name in os.listdir(gadgets_dir):
+                    staging_dir = os.path.join(gadgets_dir, name)
+                    if name.startswith(UPDATE_OWNER_PREFIX) and os.path.isdir(staging_dir):
+                        staged.update(UPDATE_OWNER_PREFIX + gadget_id for gadget_id in os.listdir(staging_dir))
+            for gadget_id in list(self.gadgets):
+                # a pending update own the files of its staged copy
+                if gadget_id not in staged and not os.path.isdir(os.path.join(gadgets_dir, gadget_id)):
+                    del self.gadgets[gadget_id]
+
+            refs = {}
+            for digests in self.gadgets.values():
+                for digest in digests:
+                    refs[digest] = refs.get(digest, 0) + 1
+
+            freed = 0
+            for digest in list(self.blobs):
+                if digest in refs:
+                    self.blobs[digest]['refs'] = refs[digest]
+                else:
+                    freed += self._remove_blob(digest)
+
+            if os.path.isdir(self.blobs_dir):
+                for prefix in os.listdir(self.blobs_dir):
+                    prefix_dir = os.path.join(self.blobs_dir, prefix)
+                    if not os.path.isdir(prefix_dir):
+                        continue
+                    for name in os.listdir(prefix_dir):
+                        if name not in self.blobs:
+                            path = os.path.join(prefix_dir, name)
+                            freed += os.path.getsize(path)
+                            os.chmod(path, stat.S_IWRITE)
+                            os.remove(path)
+        return freed
+
+    def stats(self):
+        self.load()
+        stored = sum(info['size'] for info in self.blobs.values())
+        logical = sum(info['size'] * info['refs'] for info in self.blobs.values())
+        return {
+            'gadgets': len(self.gadgets),
+            'blobs': len(self.blobs),
+            'references': sum(info['refs'] for info in self.blobs.values()),
+            'stored_bytes': stored,
+            'logical_bytes': logical,
+            'saved_bytes': logical - stored,
+        }
+
+
+def main(argv=None):
+    """gsf-blobs command line entry point"""
+    parser = argparse.ArgumentParser(prog='gsf-blobs', description="Inspect the GSF deduplicated gadget file store.")
+    parser.add_argument('command', choices=['stats', 'gc'])
+    parser.add_argument('--blobs-dir', default=BLOBS_DIR)
+    parser.add_argument('--gadgets-dir', default=os.path.join(APP_DATA_PATH, 'gadgets'))
+    args = parser.parse_args(argv)
+
+    store = BlobStore(args.blobs_dir)
+    if args.command == 'gc':
+        print(f"Freed {store.gc(args.gadgets_dir)} bytes")
+    stats = store.stats()
+    print(f"{stats['gadgets']} gadgets, {stats['blobs']} blobs, {stats['references']} references")
+    print(f"stored {stats['stored_bytes']} bytes for {stats['logical_bytes']} bytes of gadget files, "
+          f"deduplication saved {stats['saved_bytes']} bytes")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,291 @@
+import os
+import re
+import sys
+import json
+import shutil
+import hashlib
+import tempfile
+import argparse
+import posixpath
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from gsf import installer
+from gsf.blobstore import BlobStore, hash_file
+from gsf.appdata import APP_DATA_PATH, read_json, write_bytes_atomic, write_json_atomic
+
+# one sub dir per repository: index.json, index.meta.json (validators) and packages/
+CATALOG_DIR = os.path.join(APP_DATA_PATH, 'catalog')
+INDEX_FILE_NAME = 'index.json'
+META_FILE_NAME = 'index.meta.json'
+
+DEFAULT_FETCH_WORKERS = 4
+HTTP_TIMEOUT = 30
+CHUNK_SIZE = 1024 * 1024
+
+# repository index.json:
+# {"gadgets": [{"id": "clock", "name": "Clock", "version": "1.0", "description": "...",
+#               "package": "clock.zip", "sha256": "<hex>", "size": 12345}]}
+# package is relative to the index location (or an absolute url)
+ENTRY_REQUIRED_FIELDS = ('id', 'package', 'sha256')
+# the id name the cached package and the gadget dir, no separator nor '..' from a remote index
+SAFE_ID_PATTERN = re.compile(r'^[A-Za-z0-9_.-]+$')
+
+
+class CatalogError(Exception):
+    pass
+
+
+def _is_url(source):
+    return urllib.parse.urlparse(source).scheme in ('http', 'https')
+
+
+def parse_index(data):
+    """Return: { 'gadget_id': entry }, raise CatalogError when the index is malformed"""
+    try:
+        index = json.loads(data)
+    except ValueError as e:
+        raise CatalogError(f"Invalid catalog index: {e}")
+    if not isinstance(index, dict) or not isinstance(index.get('gadgets'), list):
+        raise CatalogError("Invalid catalog index: 'gadgets' list is missing")
+    entries = {}
+    for entry in index['gadgets']:
+        missing = [field for field in ENTRY_REQUIRED_FIELDS if not isinstance(entry.get(field), str)]
+        if missing:
+            raise CatalogError(f"Invalid catalog entry {entry.get('id', '?')}: missing {', '.join(missing)}")
+        if not SAFE_ID_PATTERN.match(entry['id']) or not entry['id'].strip('.'):
+            raise CatalogError(f"Invalid catalog entry id {entry['id']!r}")
+        entries[entry['id']] = entry
+    return entries
+
+
+class CatalogClient:
+    """
+    read the index of a gadget repository, a local folder or an http(s) url
+    the index is cached with its validators (ETag/Last-Modified, mtime/size for a folder)
+    so an unchanged index is not downloaded again, and the cache keep the catalog usable offline
+    """
+    def __init__(self, source, cache_root=CATALOG_DIR):
+        self.source = source if _is_url(source) else os.path.abspath(source)
+        key = hashlib.sha256(self.source.encode('utf-8')).hexdigest()[:16]
+        self.cache_dir = os.path.join(cache_root, key)
+        self.packages_dir = os.path.join(self.cache_dir, 'packages')
+        self.entries = None
+
+    def index_location(self):
+        if _is_url(self.source):
+            return self.source if self.source.endswith('.json') else self.source.rstrip('/') + '/' + INDEX_FILE_NAME
+        return self.source if os.path.isfile(self.source) else os.path.join(self.source, INDEX_FILE_NAME)
+
+    def package_location(self, entry):
+        package = entry['package']
+        if _is_url(package):
+            return package
+        index_location = self.index_location()
+        if _is_url(index_location):
+            return urllib.parse.urljoin(index_location, package)
+        return os.path.join(os.path.dirname(index_location), *posixpath.normpath(package).split('/'))
+
+    def refresh(self):
+        """
+        bring the cached index up to date
+        Return: True if a new index was fetched, False if the cached one is still valid
+        (or the repository can't be reached and the cache is used offline)
+        """
+        cache_file = os.path.join(self.cache_dir, INDEX_FILE_NAME)
+        meta_file = os.path.join(self.cache_dir, META_FILE_NAME)
+        meta = read_json(meta_file) if os.path.exists(cache_file) else None
+        meta = meta or {}
+        location = self.index_location()
+
+        try:
+            if _is_url(location):
+                data, validators = self._fetch_index_url(location, meta)
+            else:
+                data, validators = self._fetch_index_file(location, meta)
+        except (OSError, urllib.error.URLError) as e:
+            if not meta:
+                raise CatalogError(f"Cannot read the catalog index {location}: {e}")
+            print(f"Catalog {location} unreachable ({e}), using the cached index")
+            data = None
+
+        if data is None:
+            with open(cache_file, 'rb') as f:
+                self.entries = parse_index(f.read())
+            return False
+
+        # only cached once it parsed fine
+        self.entries = parse_index(data)
+        write_bytes_atomic(cache_file, data)
+        write_json_atomic(meta_file, dict(validators, source=location))
+        return True
+
+    def _fetch_index_url(self, url, meta):
+        """Return: (index bytes or None when not modified, validators)"""
+        request = urllib.request.Request(url)
+        if meta.get('etag'):
+            request.add_header('If-None-Match', meta['etag'])
+        if meta.get('last_modified'):
+            request.add_header('If-Modified-Since', meta['last_modified'])
+        try:
+            with urllib.request.urlopen(request, timeout=HTTP_TIMEOUT) as response:
+                validators = {
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                }
+                return response.read(), validators
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return None, meta
+            raise
+
+    def _fetch_index_file(self, path, meta):
+        st = os.stat(path)
+        validators = {'mtime_ns': st.st_mtime_ns, 'size': st.st_size}
+        if meta.get('mtime_ns') == validators['mtime_ns'] and meta.get('size') == validators['size']:
+            return None, meta
+        with open(path, 'rb') as f:
+            return f.read(), validators
+
+    def list_gadgets(self):
+        if self.entries is None:
+            self.refresh()
+        return [self.entries[gadget_id] for gadget_id in sorted(self.entries)]
+
+    def get_entry(self, gadget_id):
+        if self.entries is None:
+            self.refresh()
+        if gadget_id not in self.entries:
+            raise CatalogError(f"No gadget named {gadget_id} in the catalog")
+        return self.entries[gadget_id]
+
+    def cached_package_path(self, entry):
+        # named after the gadget, the installer take the gadget id from the package name
+        packages_dir = os.path.realpath(self.packages_dir)
+        path = os.path.realpath(os.path.join(packages_dir, entry['id'] + '.zip'))
+        if os.path.dirname(path) != packages_dir:
+            raise CatalogError(f"Invalid catalog entry id {entry['id']!r}")
+        return path
+
+    def fetch_package(self, entry):
+        """
+        download (or copy) one package into the cache and check its size and sha256,
+        a cached package with the right hash is not fetched again
+        Return: path of the verified package
+        """
+        target_path = self.cached_package_path(entry)
+        expected = entry['sha256'].lower()
+        if os.path.exists(target_path) and hash_file(target_path) == expected:
+            return target_path
+
+        os.makedirs(self.packages_dir, exist_ok=True)
+        location = self.package_location(entry)
+        digest = hashlib.sha256()
+        size = 0
+        tmp_path = None
+        try:
+            if _is_url(location):
+                source = urllib.request.urlopen(location, timeout=HTTP_TIMEOUT)
+            else:
+                source = open(location, 'rb')
+            with source:
+                # unique, two managers may fetch the same package at once
+                fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(target_path) + '.', suffix='.part',
+                                                dir=self.packages_dir)
+                with os.fdopen(fd, 'wb') as f:
+                    while True:
+                        chunk = source.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        digest.update(chunk)
+                        size += len(chunk)
+                        f.write(chunk)
+            if 'size' in entry and size != entry['size']:
+                raise CatalogError(f"{entry['id']}: expected {entry['size']} bytes, got {size}")
+            if digest.hexdigest() != expected:
+                raise CatalogError(f"{entry['id']}: sha256 mismatch, the package is corrupted or was tampered with")
+            os.replace(tmp_path, target_path)
+        except (OSError, urllib.error.URLError) as e:
+            raise CatalogError(f"Cannot fetch {location}: {e}")
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return target_path
+
+    def fetch_packages(self, gadget_ids, workers=DEFAULT_FETCH_WORKERS):
+        """
+        fetch several packages concurrently, at most `workers` transfers at a time
+        Return: [(gadget_id, verified package path or the exception which make it fail), ...]
+        """
+        def fetch(gadget_id):
+            try:
+                return gadget_id, self.fetch_package(self.get_entry(gadget_id))
+            except Exception as e:
+                return gadget_id, e
+
+        if self.entries is None:
+            self.refresh()
+        if not gadget_ids:
+            return []
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(gadget_ids)))) as pool:
+            return list(pool.map(fetch, gadget_ids))
+
+    def install(self, gadget_ids, gadgets_dir=installer.GADGETS_DIR, registry=None, blob_store=None,
+                workers=DEFAULT_FETCH_WORKERS):
+        """
+        fetch and verify the packages, only the verified ones are handed over to the installer
+        Return: [(gadget_id, installed gadget id or the exception which make it fail), ...]
+        """
+        fetched = self.fetch_packages(gadget_ids, workers)
+        verified = [path for _, path in fetched if not isinstance(path, Exception)]
+        installed = dict(installer.install_packages(verified, gadgets_dir, registry, blob_store=blob_store))
+        return [(gadget_id, installed.get(path, path)) for gadget_id, path in fetched]
+
+    def clear_packages(self):
+        """drop the cached packages, the index cache is kept"""
+        shutil.rmtree(self.packages_dir, ignore_errors=True)
+
+
+def main(argv=None):
+    """gsf-catalog command line entry point"""
+    parser = argparse.ArgumentParser(prog='gsf-catalog', description="Browse and install gadgets from a GSF repository.")
+    parser.add_argument('source', help="repository folder, index.json path or http(s) url")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('list', help="list the gadgets of the repository")
+    install_parser = sub.add_parser('install', help="fetch, verify and install gadgets")
+    install_parser.add_argument('gadgets', nargs='+')
+    install_parser.add_argument('--gadgets-dir', default=installer.GADGETS_DIR)
+    install_parser.add_argument('--workers', type=int, default=DEFAULT_FETCH_WORKERS, help="parallel downloads")
+    install_parser.add_argument('--no-dedup', action='store_true', help="don't link the gadget files from the blob store")
+    args = parser.parse_args(argv)
+
+    client = CatalogClient(args.source)
+    try:
+        fresh = client.refresh()
+    except CatalogError as e:
+        print(e)
+        return 1
+    print(f"Catalog index {'updated' if fresh else 'unchanged, using the cache'}")
+
+    if args.command == 'list':
+        for entry in client.list_gadgets():
+            print(f"{entry['id']:<24} {entry.get('version', 'N/A'):<10} {entry.get('description', '')}")
+        return 0
+
+    data_dir = os.path.dirname(args.gadgets_dir)
+    registry = installer.GadgetRegistry(os.path.join(data_dir, 'config', 'installed.json'))
+    blob_store = None if args.no_dedup else BlobStore(os.path.join(data_dir, 'blobs'))
+    exit_code = 0
+    for gadget_id, result in client.install(args.gadgets, args.gadgets_dir, registry, blob_store, args.workers):
+        if isinstance(result, Exception):
+            print(f"Install FAILED: {gadget_id}: {result}")
+            exit_code = 1
+        else:
+            print(f"Installed {result}")
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,29 +1,39 @@
 import sys
 import os
-import shutil
-import zipfile
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QTableWidget, QTableWidgetItem,
-    QPushButton, QHBoxLayout, QHeaderView, QFileDialog, QMessageBox
+    QPushButton, QHBoxLayout, QHeaderView, QFileDialog, QMessageBox, QCheckBox,
+    QLineEdit, QComboBox
 )
 from PySide6.QtCore import Qt, Slot, QMetaObject, Q_ARG
-from PySide6.QtGui import QIcon
+from PySide6.QtGui import QIcon, QGuiApplication, QColor
 
 from gsf.main_manager import *
+from gsf.search import TrigramIndex, sync_gadgets
 
 APP_ICON = os.path.join(os.path.dirname(__file__), 'assets', 'icon.png')
+STATUS_COLORS = {"Running": Qt.green, "Not responding": QColor(255, 140, 0), "Stopped": Qt.red}
 
 class ControlCenter(QWidget):
-    def __init__(self):
+    def __init__(self, logic=None):
+        """logic: the GadgetManagerLogic of the process to show, a new one is created if None"""
         super().__init__()
         
-        self.logic = GadgetManagerLogic()
+        # the logic is only stopped with the window when the window created it
+        self.owns_logic = logic is None
+        self.logic = logic if logic is not None else GadgetManagerLogic()
+        # name/description/id search, kept in sync with the table on every populate
+        self.search_index = TrigramIndex()
+        # the rows are updated in place, see populate_table() and refresh_status()
+        self.gadgets = {}          # { 'gadget_id': gadget data of the last discovery }
+        self.row_items = {}        # { 'gadget_id': name item of its row, which follow the row when sorted }
+        self.row_states = {}       # { 'gadget_id': (status text, tooltip) shown in its row }
+        self.gadgets_dir_stamp = None
         
         self.init_ui()
         self.populate_table()
-        self.logic.set_status_change_callback(
-            lambda: QMetaObject.invokeMethod(self, "populate_table", Qt.QueuedConnection)
-        )
+        self.status_change_callback = lambda: QMetaObject.invokeMethod(self, "refresh_status", Qt.QueuedConnection)
+        self.logic.set_status_change_callback(self.status_change_callback)
 
     def init_ui(self):
         self.setWindowIcon(QIcon(APP_ICON))
@@ -32,6 +42,15 @@ class ControlCenter(QWidget):
         self.setAttribute(Qt.WA_DeleteOnClose)
 
         layout = QVBoxLayout(self)
+
+        filter_layout = QHBoxLayout()
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Search gadgets by name, description or id...")
+        self.search_edit.setClearButtonEnabled(True)
+        self.status_filter = QComboBox()
+        self.status_filter.addItems(["All", "Running", "Not responding", "Stopped"])
+        filter_layout.addWidget(self.search_edit)
+        filter_layout.addWidget(self.status_filter)
         
         self.table = QTableWidget()
         self.table.setColumnCount(5)
@@ -48,85 +67,182 @@ class ControlCenter(QWidget):
 
         button_layout = QHBoxLayout()
         self.install_button = QPushButton("Install Gadget...")
+        self.keep_archive_checkbox = QCheckBox("Run from archive (don't extract)")
         self.uninstall_button = QPushButton("Uninstall Selected")
+        self.update_button = QPushButton("Update Selected...")
+        self.profile_button = QPushButton("Start/Stop Profiling")
+        self.arrange_button = QPushButton("Auto-arrange")
+        self.no_overlap_checkbox = QCheckBox("Prevent overlap")
+        self.no_overlap_checkbox.setChecked(self.logic.get_layout_options()['no_overlap'])
+        self.restart_hung_checkbox = QCheckBox("Restart hung gadgets")
+        self.restart_hung_checkbox.setToolTip("Restart the gadgets which stopped responding (no heartbeat) "
+                                              f"for {self.logic.get_watchdog_options()['timeout']:.0f} seconds")
+        self.restart_hung_checkbox.setChecked(self.logic.get_watchdog_options()['restart'])
+        self.layer_mode_checkbox = QCheckBox("Single desktop layer")
+        self.layer_mode_checkbox.setToolTip("Run the gadgets started from now on in one shared layer per monitor")
+        self.layer_mode_checkbox.setChecked(self.logic.presentation_mode == 'layer')
         
         button_layout.addWidget(self.install_button)
+        button_layout.addWidget(self.keep_archive_checkbox)
         button_layout.addWidget(self.uninstall_button)
+        button_layout.addWidget(self.update_button)
         button_layout.addStretch()
+        button_layout.addWidget(self.restart_hung_checkbox)
+        button_layout.addWidget(self.layer_mode_checkbox)
+        button_layout.addWidget(self.no_overlap_checkbox)
+        button_layout.addWidget(self.arrange_button)
+        button_layout.addWidget(self.profile_button)
 
+        layout.addLayout(filter_layout)
         layout.addWidget(self.table)
         layout.addLayout(button_layout)
 
+        self.search_edit.textChanged.connect(self.apply_filter)
+        self.status_filter.currentIndexChanged.connect(self.apply_filter)
+
         self.install_button.clicked.connect(self.install_gadget)
         self.uninstall_button.clicked.connect(self.uninstall_gadget)
+        self.update_button.clicked.connect(self.update_gadget)
+        self.profile_button.clicked.connect(self.toggle_profiling)
+        self.arrange_button.clicked.connect(self.auto_arrange)
+        self.layer_mode_checkbox.toggled.connect(
+            lambda checked: self.logic.set_presentation_mode('layer' if checked else 'window'))
+        self.restart_hung_checkbox.toggled.connect(lambda checked: self.logic.set_watchdog_options(restart=checked))
+        self.no_overlap_checkbox.toggled.connect(lambda checked: self.logic.set_layout_options(no_overlap=checked))
 
     @Slot()
     def populate_table(self):
+        """
+        discover the gadgets again and add, update or remove their rows,
+        after an install, update or uninstall (or when the gadgets dir changed)
+        """
+        self.gadgets_dir_stamp = self.get_gadgets_dir_stamp()
+        discovered = {gadget_data['id']: gadget_data for gadget_data in self.logic.discover_gadgets()}
+
         self.table.setUpdatesEnabled(False)
         self.table.setSortingEnabled(False)
-        
-        current_selection_id = None
-        selected_rows = self.table.selectionModel().selectedRows()
-        if selected_rows:
-            button = self.table.cellWidget(selected_rows[0].row(), 4)
-            if button:
-                current_selection_id = button.property("gadget_id")
 
-        self.table.clearContents()
-        self.table.setRowCount(0)
-        
-        all_gadgets = self.logic.discover_gadgets()
-        running_info = self.logic.get_running_gadgets_info()
-        
-        for gadget_data in all_gadgets:
-            gadget_id = gadget_data['id']
+        for gadget_id in [gid for gid in self.gadgets if gid not in discovered]:
+            self.table.removeRow(self.row_items.pop(gadget_id).row())
+            self.row_states.pop(gadget_id, None)
+
+        for gadget_id, gadget_data in discovered.items():
+            if gadget_id not in self.gadgets:
+                row_position = self.table.rowCount()
+                self.table.insertRow(row_position)
+                self.row_items[gadget_id] = QTableWidgetItem()
+                self.table.setItem(row_position, 0, self.row_items[gadget_id])
+                for column in range(1, 4):
+                    self.table.setItem(row_position, column, QTableWidgetItem())
+                # the same button start or stop the gadget, as its status change
+                action_button = QPushButton()
+                action_button.setProperty("gadget_id", gadget_id)
+                action_button.clicked.connect(lambda checked=False, gid=gadget_id: self.start_or_stop_gadget(gid))
+                self.table.setCellWidget(row_position, 4, action_button)
+            elif gadget_data == self.gadgets[gadget_id]:
+                continue
+
+            row = self.row_items[gadget_id].row()
             manifest = gadget_data['manifest']
-            row_position = self.table.rowCount()
-            self.table.insertRow(row_position)
-            
-            self.table.setItem(row_position, 0, QTableWidgetItem(manifest.get('name', 'N/A')))
-            self.table.setItem(row_position, 1, QTableWidgetItem(manifest.get('version', 'N/A')))
-            
-            is_running = gadget_id in running_info
-            status_text = "Running" if is_running else "Stopped"
-            status_color = Qt.green if is_running else Qt.red
-            status_item = QTableWidgetItem(status_text)
-            status_item.setForeground(status_color)
-            self.table.setItem(row_position, 2, status_item)
+            self.table.item(row, 0).setText(manifest.get('name', 'N/A'))
+            self.table.item(row, 1).setText(manifest.get('version', 'N/A'))
+            self.table.item(row, 3).setText(manifest.get('description', ''))
+            self.table.cellWidget(row, 4).setProperty("gadget_path", gadget_data['path'])
 
-            self.table.setItem(row_position, 3, QTableWidgetItem(manifest.get('description', '')))
+        self.gadgets = discovered
+        sync_gadgets(self.search_index, list(discovered.values()))
+        self.update_status_cells()
 
-            action_button = QPushButton("Stop" if is_running else "Start")
-            action_button.setProperty("gadget_id", gadget_id)
-            action_button.setProperty("gadget_path", gadget_data['path'])
-            
-            if is_running:
-                action_button.clicked.connect(lambda checked=False, gid=gadget_id: self.logic.terminate_gadget(gid))
-            else:
-                action_button.clicked.connect(lambda checked=False, gpath=gadget_data['path'], gid=gadget_id: self.logic.launch_gadget(gpath, gid))
-            
-            self.table.setCellWidget(row_position, 4, action_button)
-            
-            if gadget_id == current_selection_id:
-                self.table.selectRow(row_position)
-        
         self.table.setSortingEnabled(True)
+        self.apply_filter()
         self.table.setUpdatesEnabled(True)
 
+    @Slot()
+    def refresh_status(self):
+        """
+        called on every status change: only the rows whose status changed are updated,
+        the last discovery is reused unless a gadget was installed or removed meanwhile
+        """
+        if self.get_gadgets_dir_stamp() != self.gadgets_dir_stamp:
+            self.populate_table()
+            return
+
+        self.table.setUpdatesEnabled(False)
+        self.table.setSortingEnabled(False)
+        changed = self.update_status_cells()
+        self.table.setSortingEnabled(True)
+        if changed:
+            self.apply_filter()
+        self.table.setUpdatesEnabled(True)
+
+    def get_gadgets_dir_stamp(self):
+        try:
+            return os.stat(self.logic.gadgets_dir).st_mtime_ns
+        except OSError:
+            return None
+
+    def update_status_cells(self):
+        """
+        set the status cell and the action button of the rows whose status changed, the
+        health comes from the last status poll, no heartbeat is read here
+        Return: True if the status text of a row changed (the filter must be applied again)
+        """
+        running_info = self.logic.get_running_gadgets_info()
+        changed = False
+        for gadget_id, name_item in self.row_items.items():
+            is_running = gadget_id in running_info
+            status_text = "Running" if is_running else "Stopped"
+            tooltip = ""
+            if is_running:
+                if gadget_id in self.logic.not_responding:
+                    status_text = "Not responding"
+                health = self.logic.last_health.get(gadget_id)
+                if health and health['lag_ms'] and health['lag_ms']['count']:
+                    lag = health['lag_ms']
+                    tooltip = (f"Event loop lag: p50 {lag['p50']:.1f} ms, p90 {lag['p90']:.1f} ms, "
+                               f"p99 {lag['p99']:.1f} ms, max {lag['max']:.1f} ms")
+
+            previous = self.row_states.get(gadget_id)
+            if previous == (status_text, tooltip):
+                continue
+            self.row_states[gadget_id] = (status_text, tooltip)
+            row = name_item.row()
+            status_item = self.table.item(row, 2)
+            status_item.setToolTip(tooltip)
+            if previous is not None and previous[0] == status_text:
+                continue
+            status_item.setText(status_text)
+            status_item.setForeground(STATUS_COLORS[status_text])
+            self.table.cellWidget(row, 4).setText("Stop" if is_running else "Start")
+            changed = True
+        return changed
+
+    def start_or_stop_gadget(self, gadget_id):
+        if gadget_id in self.logic.get_running_gadgets_info():
+            self.logic.terminate_gadget(gadget_id)
+        else:
+            self.logic.launch_gadget(self.gadgets[gadget_id]['path'], gadget_id)
+
+    @Slot()
+    def apply_filter(self):
+        """hide the rows not matching the search box and the status filter, the table is not rebuilt"""
+        matches = self.search_index.search(self.search_edit.text())
+        status = self.status_filter.currentText()
+        for row in range(self.table.rowCount()):
+            button = self.table.cellWidget(row, 4)
+            status_item = self.table.item(row, 2)
+            visible = button is not None and button.property("gadget_id") in matches
+            if visible and status != "All":
+                visible = status_item is not None and status_item.text() == status
+            self.table.setRowHidden(row, not visible)
+
     def install_gadget(self):
         file_path, _ = QFileDialog.getOpenFileName(self, "Select Gadget Package", "", "Zip Files (*.zip)")
         if not file_path:
             return
 
         try:
-            target_path = os.path.join(self.logic.gadgets_dir, os.path.splitext(os.path.basename(file_path))[0])
-            if os.path.exists(target_path):
-                QMessageBox.warning(self, "Install FAILED", f"The gadget named {os.path.basename(target_path)} has aleady existed, please uninstall firstly!")
-                return
-            
-            with zipfile.ZipFile(file_path, 'r') as zip_ref:
-                zip_ref.extractall(self.logic.gadgets_dir)
-            
+            self.logic.install_gadget(file_path, keep_archive=self.keep_archive_checkbox.isChecked())
             QMessageBox.information(self, "Success", "Install Gadget successfully！")
             self.populate_table()
         except Exception as e:
@@ -153,18 +269,78 @@ class ControlCenter(QWidget):
                                      QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
 
         if reply == QMessageBox.Yes:
-            target_path = os.path.join(self.logic.gadgets_dir, gadget_id)
             try:
-                shutil.rmtree(target_path)
+                self.logic.uninstall_gadget(gadget_id)
                 QMessageBox.information(self, "Success", f"'{gadget_id}' has been uninstalled!")
                 self.populate_table()
             except Exception as e:
                 QMessageBox.critical(self, "Uninstall FAILED", f"Occur error when uninstall the gadget: {e}")
 
+    def update_gadget(self):
+        selected_rows = self.table.selectionModel().selectedRows()
+        if not selected_rows:
+            QMessageBox.information(self, "Notice", "Please select a gadget which need to be updated.")
+            return
+
+        button_widget = self.table.cellWidget(selected_rows[0].row(), 4)
+        if not button_widget: return
+        gadget_id = button_widget.property("gadget_id")
+
+        file_path, _ = QFileDialog.getOpenFileName(self, f"Select the new package of '{gadget_id}'", "", "Zip Files (*.zip)")
+        if not file_path:
+            return
+
+        try:
+            report = self.logic.update_gadget(gadget_id, file_path)
+        except Exception as e:
+            QMessageBox.critical(self, "Update FAILED", f"Update FAILED: {e}")
+            return
+        if not report['changed'] and not report['removed']:
+            QMessageBox.information(self, "Update", f"'{gadget_id}' is already up to date.")
+        else:
+            QMessageBox.information(
+                self, "Success",
+                f"'{gadget_id}' updated from {report['old_version']} to {report['new_version']}.\n"
+                f"{report['changed']} files changed, {report['removed']} removed, {report['bytes_written']} bytes written.\n"
+                f"Downtime: {report['downtime_ms']:.0f} ms")
+        self.populate_table()
+
+    def auto_arrange(self):
+        screens = [
+            (g.x(), g.y(), g.width(), g.height())
+            for g in (screen.availableGeometry() for screen in QGuiApplication.screens())
+        ]
+        self.logic.auto_arrange(screens)
+
+    def toggle_profiling(self):
+        selected_rows = self.table.selectionModel().selectedRows()
+        if not selected_rows:
+            QMessageBox.information(self, "Notice", "Please select a gadget which need to be profiled.")
+            return
+
+        button_widget = self.table.cellWidget(selected_rows[0].row(), 4)
+        if not button_widget: return
+        gadget_id = button_widget.property("gadget_id")
+
+        if self.logic.is_profiling(gadget_id):
+            profile_dir = self.logic.stop_profiling(gadget_id)
+            QMessageBox.information(self, "Profiling", f"Profiling of '{gadget_id}' stopped, results will be written to:\n{profile_dir}")
+            return
+
+        profile_dir = self.logic.start_profiling(gadget_id)
+        if profile_dir is None:
+            QMessageBox.warning(self, "Profiling FAILED", "Please start the gadget before profiling it!")
+            return
+        QMessageBox.information(self, "Profiling", f"Profiling of '{gadget_id}' started (cpu, memory, timing).\nClick again to stop and write the results.")
+
     def closeEvent(self, event):
-        print("Control Center is closing, cancelling its logic poller.")
-        if self.logic and self.logic.status_poll_timer:
-            self.logic.status_poll_timer.cancel()
+        if self.owns_logic:
+            print("Control Center is closing, cancelling its logic poller.")
+            if self.logic.status_poll_timer:
+                self.logic.status_poll_timer.cancel()
+        elif self.logic.on_status_change is self.status_change_callback:
+            # the window is deleted on close, a shared logic must not call it anymore
+            self.logic.on_status_change = None
         super().closeEvent(event)
 
 def main():
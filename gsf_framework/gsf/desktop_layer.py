@@ -0,0 +1,278 @@
+import os
+import sys
+import time
+import argparse
+from PySide6.QtWidgets import QApplication, QWidget
+from PySide6.QtGui import QPainter, QColor, QRegion, QFont
+from PySide6.QtCore import Qt, QObject, QTimer, QEvent, QPoint
+
+from gsf.gadget_base import BaseGadget
+from gsf.launcher import load_entry_module
+from gsf.installer import load_manifest
+from gsf.profiler import Histogram
+from gsf.appdata import APP_DATA_PATH, read_json, write_json_atomic
+
+# written by the manager: the gadgets the host should run { 'gadget_id': {'path', 'token'} }
+LAYER_REQUEST_FILE = os.path.join(APP_DATA_PATH, 'config', 'layer_request.json')
+# written by the host: { 'gadget_id': {'token', 'state': 'running' | 'closed'} }
+LAYER_STATE_FILE = os.path.join(APP_DATA_PATH, 'config', 'layer_state.json')
+
+SYNC_INTERVAL_MS = 1000
+
+
+def write_layer_request(requested):
+    write_json_atomic(LAYER_REQUEST_FILE, requested)
+
+
+def find_gadget_class(module, class_name=None):
+    """the BaseGadget sub-class of the entry module, named by the manifest 'class' or the only one"""
+    if class_name:
+        return getattr(module, class_name)
+    classes = [
+        obj for obj in vars(module).values()
+        if isinstance(obj, type) and issubclass(obj, BaseGadget) and obj.__module__ == module.__name__
+    ]
+    if len(classes) != 1:
+        raise LookupError(f"Cannot find the gadget class in {module.__file__}, set 'class' in gadget.json")
+    return classes[0]
+
+
+class DesktopLayer(QWidget):
+    """
+    one full-screen transparent top-level window per monitor, every gadget is a child of it:
+    Qt composite them into a single backing store, repaint only the dirty regions of
+    gadgets which called update() and route the input to the child under the cursor
+    the mask keep the empty parts of the layer click-through
+    """
+    def __init__(self, screen):
+        super().__init__()
+        self.setWindowFlags(
+            Qt.FramelessWindowHint |
+            Qt.WindowStaysOnTopHint |
+            Qt.Tool
+        )
+        self.setAttribute(Qt.WA_TranslucentBackground)
+        self.setScreen(screen)
+        self.setGeometry(screen.geometry())
+
+    def gadgets(self):
+        return [child for child in self.children() if isinstance(child, QWidget) and not child.isWindow()]
+
+    def update_mask(self):
+        region = QRegion()
+        for gadget in self.gadgets():
+            if gadget.isVisible():
+                region = region.united(gadget.geometry())
+        if region.isEmpty():
+            self.hide()
+        else:
+            self.setMask(region)
+            self.show()
+
+    def childEvent(self, event):
+        if event.type() == QEvent.ChildAdded and isinstance(event.child(), QWidget):
+            event.child().installEventFilter(self)
+        if event.type() in (QEvent.ChildAdded, QEvent.ChildRemoved):
+            # ChildAdded come before the child is set up, look again once the event loop run
+            QTimer.singleShot(0, self.update_mask)
+        super().childEvent(event)
+
+    def eventFilter(self, obj, event):
+        if event.type() in (QEvent.Move, QEvent.Resize, QEvent.Show, QEvent.Hide):
+            self.update_mask()
+        return False
+
+
+class LayerHost(QObject):
+    """
+    run many gadgets in-process on top of one DesktopLayer per monitor
+    the manager tell which gadgets to run through LAYER_REQUEST_FILE
+    """
+    def __init__(self, app):
+        super().__init__()
+        self.app = app
+        self.layers = []
+        self.gadgets = {}  # { 'gadget_id': BaseGadget }
+        self.state = {}    # mirror of LAYER_STATE_FILE
+
+        # BaseGadget.init_ui attach new gadgets to us instead of making them top-level windows
+        BaseGadget.layer_host = self
+
+        for screen in app.screens():
+            self.add_layer(screen)
+        app.screenAdded.connect(self.add_layer)
+
+        self.sync_timer = QTimer(self)
+        self.sync_timer.timeout.connect(self.sync)
+        self.sync_timer.start(SYNC_INTERVAL_MS)
+        self.sync()
+
+    def add_layer(self, screen):
+        self.layers.append(DesktopLayer(screen))
+
+    def layer_at(self, global_point):
+        for layer in self.layers:
+            if layer.geometry().contains(global_point):
+                return layer
+        return self.layers[0]
+
+    def attach(self, gadget, global_pos=None):
+        """(re)parent a gadget to the layer of the monitor holding global_pos"""
+        layer = self.layer_at(global_pos if global_pos is not None else gadget.geometry().topLeft())
+        if gadget.parentWidget() is not layer:
+            was_visible = gadget.isVisible()
+            gadget.setParent(layer)
+            if was_visible:
+                gadget.show()
+        return layer
+
+    def sync(self):
+        """start the newly requested gadgets, close the ones not requested anymore"""
+        requested = read_json(LAYER_REQUEST_FILE, {})
+        changed = False
+
+        for gadget_id in list(self.gadgets):
+            if gadget_id not in requested:
+                self.stop_gadget(gadget_id)
+                self.state.pop(gadget_id, None)
+                changed = True
+
+        for gadget_id, request in requested.items():
+            known = self.state.get(gadget_id)
+            if known and known['token'] == request['token']:
+                continue # running, or closed by the user: wait for a new launch request
+            if gadget_id in self.gadgets:
+                # restarted or updated by the manager since the last sync, run it again from its files
+                self.stop_gadget(gadget_id)
+            self.state[gadget_id] = {'token': request['token'], 'state': 'running'}
+            try:
+                self.start_gadget(gadget_id, request['path'])
+            except Exception as e:
+                print(f"Cannot start gadget {gadget_id} in the desktop layer: {e}")
+                self.state[gadget_id]['state'] = 'closed'
+            changed = True
+
+        if changed:
+            write_json_atomic(LAYER_STATE_FILE, self.state)
+
+        # nothing left to host
+        if not requested and not self.gadgets:
+            self.app.quit()
+
+    def start_gadget(self, gadget_id, gadget_path):
+        manifest = load_manifest(gadget_path)
+        entry_point = os.path.join(gadget_path, manifest['entry_point'])
+        module = load_entry_module(entry_point, gadget_path, f"gsf_gadget_{gadget_id}")
+        gadget = find_gadget_class(module, manifest.get('class'))(gadget_path)
+        self.gadgets[gadget_id] = gadget
+        gadget.show()
+        print(f"Gadget {gadget_id} started in the desktop layer")
+
+    def launch_token(self, gadget_id):
+        """the token of the manager request, the hosted gadget send it in its heartbeats"""
+        return self.state.get(gadget_id, {}).get('token')
+
+    def stop_gadget(self, gadget_id):
+        gadget = self.gadgets.pop(gadget_id)
+        gadget_path = os.path.abspath(gadget.gadget_path)
+        gadget.close()
+        gadget.deleteLater()
+        # the next start import the entry module and its helpers again, maybe updated
+        for name, module in list(sys.modules.items()):
+            module_file = getattr(module, '__file__', None)
+            if module_file and os.path.abspath(module_file).startswith(gadget_path + os.sep):
+                del sys.modules[name]
+
+    def gadget_closed(self, gadget_id):
+        """called by BaseGadget.closeEvent, the user closed it from its context menu"""
+        if self.gadgets.pop(gadget_id, None) is None:
+            return # closed by sync()
+        if gadget_id in self.state:
+            self.state[gadget_id]['state'] = 'closed'
+            write_json_atomic(LAYER_STATE_FILE, self.state)
+
+
+# --- frame time comparison, per-window vs one layer ---
+class _BenchWidget(QWidget):
+    """paint like the clock gadget"""
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setBrush(QColor(0, 0, 0, 120))
+        painter.setPen(Qt.NoPen)
+        painter.drawEllipse(self.rect())
+        painter.setFont(QFont('Segoe UI', 16, QFont.Bold))
+        painter.setPen(QColor(255, 255, 255))
+        painter.drawText(self.rect(), Qt.AlignCenter, time.strftime('%H:%M:%S'))
+
+
+def benchmark(app, mode, count, seconds, size=160):
+    """
+    repaint `count` gadget-like widgets every frame
+    Return: Histogram of the in-process frame time in ms (paint + flush to the window system),
+    the desktop compositor blending cost come on top and is not visible from here
+    """
+    screen = app.primaryScreen().availableGeometry()
+    per_row = max(1, screen.width() // size)
+    widgets = []
+    layer = DesktopLayer(app.primaryScreen()) if mode == 'layer' else None
+    for i in range(count):
+        pos = QPoint(screen.x() + (i % per_row) * size, screen.y() + (i // per_row) * size % screen.height())
+        if layer:
+            widget = _BenchWidget(layer)
+            widget.setGeometry(pos.x() - layer.x(), pos.y() - layer.y(), size, size)
+        else:
+            widget = _BenchWidget()
+            widget.setWindowFlags(Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint | Qt.Tool)
+            widget.setAttribute(Qt.WA_TranslucentBackground)
+            widget.setGeometry(pos.x(), pos.y(), size, size)
+        widget.show()
+        widgets.append(widget)
+    if layer:
+        layer.update_mask()
+
+    histogram = Histogram()
+    deadline = time.perf_counter() + seconds
+
+    def frame():
+        start = time.perf_counter()
+        for widget in widgets:
+            widget.repaint()
+        histogram.record((time.perf_counter() - start) * 1000.0)
+        if time.perf_counter() >= deadline:
+            timer.stop()
+            app.quit()
+
+    timer = QTimer()
+    timer.timeout.connect(frame)
+    timer.start(16)
+    app.exec()
+
+    for widget in widgets:
+        widget.close()
+    if layer:
+        layer.close()
+    return histogram
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='gsf-layer', description="GSF single desktop layer host.")
+    parser.add_argument('--benchmark', type=int, metavar='N', help="compare frame time of N per-window vs layer gadgets")
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args(argv)
+
+    app = QApplication(sys.argv[:1])
+    if args.benchmark:
+        for mode in ('window', 'layer'):
+            summary = benchmark(app, mode, args.benchmark, args.seconds).summary()
+            print(f"{mode}: {summary['count']} frames, frame time p50 {summary['p50']} ms, "
+                  f"p90 {summary['p90']} ms, max {summary['max']:.2f} ms")
+        return 0
+
+    app.setQuitOnLastWindowClosed(False)
+    host = LayerHost(app)
+    return app.exec()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,24 +1,80 @@
 import sys
 import os
 import json
+import time
 from PySide6.QtWidgets import QWidget, QMenu
-from PySide6.QtGui import QMouseEvent, QAction
-from PySide6.QtCore import Qt, QPoint, QSettings
+from PySide6.QtGui import QMouseEvent, QAction, QGuiApplication, QImage
+from PySide6.QtCore import Qt, QPoint, QRect, QSettings, QTimer, QEvent
+
+from gsf.profiler import GadgetProfiler
+from gsf.watchdog import Heartbeat
+from gsf.asset_cache import get_asset_cache
+from gsf.archive import GadgetArchive, is_archive_gadget, archive_settings_file
+from gsf import layout
+
+def _decode_image(data):
+    """decoder of the shared asset cache, Return: (width, height, bytes per line, pixels)"""
+    image = QImage.fromData(bytes(data))
+    if image.isNull():
+        raise ValueError("Not a supported image")
+    image = image.convertToFormat(QImage.Format_ARGB32_Premultiplied)
+    # constBits() does not keep the converted image alive, copy them while it is
+    return image.width(), image.height(), image.bytesPerLine(), bytes(image.constBits())
+
+def _wrap_shared_pixels(asset):
+    """
+    QImage over the read-only mapped pixels of a SharedAsset, to keep and never hand out
+    PySide only bind the writable uchar* constructor, so Qt would write in place into the
+    read-only mapping (crash); images shared with this one are copied on their first write
+    instead, as Qt detach the pixels of an image whose data is referenced more than once
+    """
+    return QImage(asset.pixels, asset.width, asset.height, asset.bytes_per_line, QImage.Format(asset.format))
 
 class BaseGadget(QWidget):
+    # set by the desktop layer host, gadgets are then children of its per-monitor layer
+    layer_host = None
+
     def __init__(self, gadget_path):
         super().__init__()
         self.gadget_path = gadget_path
         self.settings_file = os.path.join(self.gadget_path, 'config.ini')
 
+        # gadget run straight from its package, assets are read from the mapped archive
+        self.archive = None
+        if is_archive_gadget(self.gadget_path):
+            self.archive = GadgetArchive(self.gadget_path)
+            self.settings_file = archive_settings_file(self.gadget_path)
+
+        self.gadget_id = os.path.basename(os.path.normpath(self.gadget_path))
+        if self.archive:
+            self.gadget_id = os.path.splitext(self.gadget_id)[0]
+
+        # decoded images shared with the other gadget processes, see shared_image()
+        self.shared_images = {}  # { relpath: (SharedAsset, QImage) }
+
+        # first, event() rely on it
+        self.init_profiler()
         self.init_ui()
+        self.init_dragging()
         self.load_position()
 
-        # for window dragging
-        self.drag_position = QPoint()
+        # poll the requests of the manager (profiling, auto-arrange moves) and send the heartbeat,
+        # precise so its lateness measure the event loop lag and not the timer slack
+        token = self.layer_host.launch_token(self.gadget_id) if self.layer_host is not None else None
+        self.heartbeat = Heartbeat(self.gadget_id, GadgetProfiler.POLL_INTERVAL_MS, token=token)
+        self.control_timer = QTimer(self)
+        self.control_timer.setTimerType(Qt.PreciseTimer)
+        self.control_timer.timeout.connect(self.poll_manager_requests)
+        self.control_timer.start(GadgetProfiler.POLL_INTERVAL_MS)
+        self.heartbeat.beat()
 
     def init_ui(self):
         """initizing the window standard style"""
+        if self.layer_host is not None:
+            # composited by the shared layer, not a window of its own
+            self.layer_host.attach(self)
+            self.setAttribute(Qt.WA_TranslucentBackground)
+            return
         self.setWindowFlags(
             Qt.FramelessWindowHint |          # no border
             Qt.WindowStaysOnTopHint |          # always top
@@ -26,32 +82,203 @@ class BaseGadget(QWidget):
         )
         self.setAttribute(Qt.WA_TranslucentBackground) # background transparent
 
+    def init_profiler(self):
+        """built-in profiling agent, idle until the manager request it"""
+        self.profiler = GadgetProfiler(self.gadget_id)
+
+        # only run while timing profiling is on, measure how late the event loop fire it
+        self.loop_lag_timer = QTimer(self)
+        self.loop_lag_timer.setInterval(GadgetProfiler.LOOP_LAG_INTERVAL_MS)
+        self.loop_lag_timer.timeout.connect(self.on_loop_lag_tick)
+        self.loop_lag_last_tick = None
+
+    def poll_manager_requests(self):
+        self.heartbeat.beat()
+        self.check_profiling_request()
+        self.check_move_request()
+
+    def check_move_request(self):
+        """the manager auto-arranged the gadgets"""
+        pos = layout.take_move_request(self.gadget_id)
+        if pos is not None:
+            self.move_global(QPoint(*pos))
+            self.publish_rect()
+            self.save_position()
+
+    def check_profiling_request(self):
+        if not self.profiler.check_control():
+            return
+        if self.profiler.timing_enabled:
+            self.loop_lag_last_tick = time.perf_counter()
+            self.loop_lag_timer.start()
+        else:
+            self.loop_lag_timer.stop()
+
+    def on_loop_lag_tick(self):
+        now = time.perf_counter()
+        if self.profiler.timing_enabled and self.loop_lag_last_tick is not None:
+            expected = GadgetProfiler.LOOP_LAG_INTERVAL_MS / 1000.0
+            self.profiler.record_loop_lag(now - self.loop_lag_last_tick - expected)
+        self.loop_lag_last_tick = now
+
+    def event(self, event):
+        """time paint events while timing profiling is on"""
+        if self.profiler.timing_enabled and event.type() == QEvent.Paint:
+            start = time.perf_counter()
+            result = super().event(event)
+            self.profiler.record_paint(time.perf_counter() - start)
+            return result
+        return super().event(event)
+
+    def read_asset(self, relpath):
+        """
+        read a file shipped with the gadget, works the same for extracted and archive gadgets
+        e.g. pixmap.loadFromData(self.read_asset('images/bg.png'))
+        """
+        if self.archive:
+            return self.archive.read(relpath)
+        with open(os.path.join(self.gadget_path, relpath), 'rb') as f:
+            return f.read()
+
+    def shared_image(self, relpath):
+        """
+        decode an image shipped with the gadget once for all gadget processes: the pixels live
+        in a memory-mapped segment of the asset cache, the returned QImage share them without copy
+        painting it never copy; modifying it copy the pixels first, see _wrap_shared_pixels()
+        e.g. painter.drawImage(0, 0, self.shared_image('images/bg.png'))
+        """
+        if relpath not in self.shared_images:
+            asset = get_asset_cache().acquire(self.read_asset(relpath), _decode_image,
+                                              QImage.Format_ARGB32_Premultiplied.value)
+            self.shared_images[relpath] = (asset, _wrap_shared_pixels(asset))
+        # an implicitly shared copy of the held image, any write on it detach
+        return QImage(self.shared_images[relpath][1])
+
+    def release_shared_images(self):
+        """the QImages must be dropped before their segment is unmapped"""
+        cache = get_asset_cache()
+        while self.shared_images:
+            _, (asset, image) = self.shared_images.popitem()
+            del image
+            cache.release(asset)
+
     def load_position(self):
         """load window pos from setting file"""
+        # auto-arranged while the gadget was not running
+        pos = layout.take_move_request(self.gadget_id)
+        if pos is not None:
+            self.move_global(QPoint(*pos))
+            return
         settings = QSettings(self.settings_file, QSettings.IniFormat)
         pos = settings.value("geometry/pos")
         if pos is not None:
-            self.move(pos)
+            self.move_global(pos)
 
     def save_position(self):
         """save current pos into setting file"""
         settings = QSettings(self.settings_file, QSettings.IniFormat)
-        settings.setValue("geometry/pos", self.pos())
+        settings.setValue("geometry/pos", self.global_rect().topLeft())
+
+    def global_rect(self):
+        """frame geometry in desktop coordinates, also when living in a desktop layer"""
+        if self.isWindow():
+            return self.frameGeometry()
+        return QRect(self.mapToGlobal(QPoint(0, 0)), self.size())
+
+    def move_global(self, pos, reparent=True):
+        """
+        move to a desktop position, in a desktop layer the gadget is (unless reparent is False)
+        handed over to the layer of the monitor it lands on
+        """
+        if self.isWindow():
+            self.move(pos)
+            return
+        if reparent:
+            self.layer_host.attach(self, pos + QPoint(self.width() // 2, self.height() // 2))
+        self.move(pos - self.parentWidget().geometry().topLeft())
+
+    def publish_rect(self):
+        """share the gadget rect with the other gadgets and the manager, for snapping/arranging"""
+        geometry = self.global_rect()
+        layout.write_rect(self.gadget_id, (geometry.x(), geometry.y(), geometry.width(), geometry.height()))
+
+    def screen_rects(self):
+        return [
+            (g.x(), g.y(), g.width(), g.height())
+            for g in (screen.availableGeometry() for screen in QGuiApplication.screens())
+        ]
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.publish_rect()
 
     def closeEvent(self, event):
         """auto-save pos into setting file"""
         self.save_position()
+        if self.profiler.active_modes:
+            self.profiler.stop()
+        self.heartbeat.stop()
+        self.control_timer.stop()
+        self.release_shared_images()
+        if self.archive:
+            try:
+                self.archive.close()
+            except BufferError:
+                # assets still referenced by the gadget, unmapped once they are freed
+                pass
+        layout.remove_rect(self.gadget_id)
+        if self.layer_host is not None:
+            self.layer_host.gadget_closed(self.gadget_id)
         event.accept()
 
     # --- standard dragging logic ---
+    # mouse moves are coalesced, only the latest position is applied once per frame
+    DRAG_FRAME_MS = 16
+
+    def init_dragging(self):
+        self.drag_position = QPoint()
+        self.pending_drag_pos = None
+        self.layout_engine = None # built for the duration of a drag
+
+        self.drag_timer = QTimer(self)
+        self.drag_timer.setSingleShot(True)
+        self.drag_timer.setInterval(self.DRAG_FRAME_MS)
+        self.drag_timer.timeout.connect(self.apply_pending_drag)
+
     def mousePressEvent(self, event: QMouseEvent):
         if event.button() == Qt.LeftButton:
-            self.drag_position = event.globalPosition().toPoint() - self.frameGeometry().topLeft()
+            self.drag_position = event.globalPosition().toPoint() - self.global_rect().topLeft()
+            # one read of the other gadgets rects per drag, queries go through the spatial index
+            self.layout_engine = layout.LayoutEngine.from_layout_dir(self.screen_rects(), exclude=self.gadget_id)
             event.accept()
 
     def mouseMoveEvent(self, event: QMouseEvent):
         if event.buttons() == Qt.LeftButton:
-            self.move(event.globalPosition().toPoint() - self.drag_position)
+            self.pending_drag_pos = event.globalPosition().toPoint() - self.drag_position
+            if not self.drag_timer.isActive():
+                self.drag_timer.start()
+            event.accept()
+
+    def apply_pending_drag(self):
+        if self.pending_drag_pos is None:
+            return
+        pos = self.pending_drag_pos
+        self.pending_drag_pos = None
+        if self.layout_engine:
+            pos = QPoint(*self.layout_engine.snap(self.gadget_id, (pos.x(), pos.y(), self.width(), self.height())))
+        # no reparenting while the mouse is grabbed, done on release
+        self.move_global(pos, reparent=False)
+
+    def mouseReleaseEvent(self, event: QMouseEvent):
+        if event.button() == Qt.LeftButton and self.layout_engine:
+            self.drag_timer.stop()
+            self.apply_pending_drag()
+            geometry = self.global_rect()
+            self.move_global(QPoint(*self.layout_engine.find_free_position(
+                self.gadget_id, (geometry.x(), geometry.y(), geometry.width(), geometry.height()))))
+            self.layout_engine = None
+            self.publish_rect()
+            self.save_position()
             event.accept()
 
     # --- standard right-click menu ---
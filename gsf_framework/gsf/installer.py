@@ -0,0 +1,749 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import zipfile
+import tempfile
+import marshal
+import posixpath
+import argparse
+import subprocess
+import py_compile
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
+
+from gsf import archive
+from gsf.blobstore import BlobStore, UPDATE_OWNER_PREFIX, hash_file, remove_tree
+from gsf import metrics
+from gsf.appdata import APP_DATA_PATH, CONFIG_DIR, read_json, write_json_atomic, file_lock
+
+GADGETS_DIR = os.path.join(APP_DATA_PATH, 'gadgets')
+REGISTRY_FILE = os.path.join(CONFIG_DIR, 'installed.json')
+
+MANIFEST_FILE = 'gadget.json'
+
+# field name -> (expected type, required, default)
+MANIFEST_SCHEMA = {
+    'name': (str, True, None),
+    'version': (str, False, 'N/A'),
+    'description': (str, False, ''),
+    'entry_point': (str, False, 'main.py'),
+    'class': (str, False, None),  # BaseGadget sub-class, for the desktop layer host
+}
+
+# below this number of sources a process pool cost more than it save
+PARALLEL_COMPILE_THRESHOLD = 16
+
+# written by the gadget at run time (QSettings), not part of its package, carried over by updates
+PRESERVED_FILES = {'config.ini'}
+
+
+class InstallError(Exception):
+    pass
+
+
+class ManifestError(InstallError):
+    pass
+
+
+def validate_manifest(manifest, entry_exists):
+    """
+    check a parsed gadget.json against MANIFEST_SCHEMA and fill the defaults
+    entry_exists: callable telling whether a path relative to the gadget root is a file
+    Return: the normalized manifest
+    """
+    if not isinstance(manifest, dict):
+        raise ManifestError("gadget.json must contain a JSON object")
+
+    normalized = dict(manifest)
+    for field, (expected_type, required, default) in MANIFEST_SCHEMA.items():
+        if field not in manifest:
+            if required:
+                raise ManifestError(f"gadget.json is missing the required field '{field}'")
+            normalized[field] = default
+        elif not isinstance(manifest[field], expected_type):
+            raise ManifestError(f"gadget.json field '{field}' must be a {expected_type.__name__}")
+
+    entry_point = normalized['entry_point']
+    entry_path = posixpath.normpath(entry_point.replace('\\', '/'))
+    if entry_path.startswith('../') or posixpath.isabs(entry_path) or ':' in entry_path:
+        raise ManifestError(f"entry_point '{entry_point}' points outside the gadget folder")
+    if not entry_point.endswith('.py'):
+        raise ManifestError(f"entry_point '{entry_point}' is not a python file")
+    if not entry_exists(entry_path):
+        raise ManifestError(f"entry_point '{entry_point}' not found")
+    return normalized
+
+
+def load_manifest(gadget_path):
+    """read and validate the gadget.json of a gadget folder or archive"""
+    if archive.is_archive_gadget(gadget_path):
+        return _load_archive_manifest(gadget_path)
+
+    manifest_path = os.path.join(gadget_path, MANIFEST_FILE)
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise ManifestError(f"{MANIFEST_FILE} not found")
+    except ValueError as e:
+        raise ManifestError(f"{MANIFEST_FILE} is not valid JSON: {e}")
+    return validate_manifest(manifest, lambda rel: os.path.isfile(os.path.join(gadget_path, rel)))
+
+
+def _load_archive_manifest(archive_path):
+    """only the central directory and gadget.json are read"""
+    try:
+        with zipfile.ZipFile(archive_path, 'r') as zip_ref:
+            names = set(zip_ref.namelist())
+            root = archive.find_archive_root(names)
+            if root is None:
+                raise ManifestError(f"{MANIFEST_FILE} not found")
+            manifest = json.loads(zip_ref.read(root + MANIFEST_FILE).decode('utf-8'))
+    except zipfile.BadZipFile as e:
+        raise ManifestError(f"Not a valid gadget package: {e}")
+    except ValueError as e:
+        raise ManifestError(f"{MANIFEST_FILE} is not valid JSON: {e}")
+    return validate_manifest(manifest, lambda rel: root + rel in names)
+
+
+def _manifest_stamp(gadget_path):
+    """mtime of what the manifest is read from, the archive itself for archive gadgets"""
+    if archive.is_archive_gadget(gadget_path):
+        return os.stat(gadget_path).st_mtime_ns
+    return os.stat(os.path.join(gadget_path, MANIFEST_FILE)).st_mtime_ns
+
+
+def find_sources(gadget_path):
+    sources = []
+    for root, dirs, files in os.walk(gadget_path):
+        dirs[:] = [d for d in dirs if d != '__pycache__']
+        sources.extend(os.path.join(root, name) for name in files if name.endswith('.py'))
+    return sources
+
+
+def _compile_source(source_path):
+    """
+    write the __pycache__ bytecode of one file, return the error message if any
+    the pyc is validated by source hash, not mtime: deduplicated sources take the mtime of their blob
+    """
+    try:
+        py_compile.compile(source_path, doraise=True, invalidation_mode=py_compile.PycInvalidationMode.CHECKED_HASH)
+        return None
+    except py_compile.PyCompileError as e:
+        return e.msg
+
+
+def precompile_sources(gadget_paths, workers=None):
+    """
+    compile every gadget source to cached bytecode, in parallel when there are enough of them
+    Return: {source_path: error message} for the files which failed
+    """
+    return compile_sources([source for gadget_path in gadget_paths for source in find_sources(gadget_path)], workers)
+
+
+def compile_sources(sources, workers=None):
+    """Return: {source_path: error message} for the files which failed"""
+    if workers == 1 or len(sources) < PARALLEL_COMPILE_THRESHOLD:
+        results = map(_compile_source, sources)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_compile_source, sources, chunksize=8))
+    return {source: error for source, error in zip(sources, results) if error}
+
+
+class GadgetRegistry:
+    """
+    validated manifests of installed gadgets,
+    so discovery and launch don't need to parse and validate gadget.json again
+    the tray, the service and gsf-install share the file: save() write only the entries
+    changed here, merged under a lock into what the others saved meanwhile
+    """
+    def __init__(self, registry_file=REGISTRY_FILE):
+        self.registry_file = registry_file
+        self.entries = {}  # { 'gadget_id': {'path', 'manifest', 'manifest_mtime', 'installed_at'} }
+        self.changed = set()  # ids added or removed since the last save
+        self.load()
+
+    def load(self):
+        self.entries = read_json(self.registry_file) or {}
+        self.changed = set()
+
+    def save(self):
+        if not self.changed:
+            return
+        with file_lock(self.registry_file):
+            entries = read_json(self.registry_file) or {}
+            for gadget_id in self.changed:
+                if gadget_id in self.entries:
+                    entries[gadget_id] = self.entries[gadget_id]
+                else:
+                    entries.pop(gadget_id, None)
+            write_json_atomic(self.registry_file, entries)
+        self.entries = entries
+        self.changed = set()
+
+    def get_manifest(self, gadget_id, gadget_path):
+        """Return: the stored manifest, None when unknown or gadget.json changed since"""
+        entry = self.entries.get(gadget_id)
+        if not entry or os.path.normcase(entry['path']) != os.path.normcase(os.path.abspath(gadget_path)):
+            return None
+        try:
+            mtime = _manifest_stamp(gadget_path)
+        except OSError:
+            return None
+        return entry['manifest'] if entry['manifest_mtime'] == mtime else None
+
+    def add(self, gadget_id, gadget_path, manifest, save=True):
+        self.entries[gadget_id] = {
+            'path': os.path.abspath(gadget_path),
+            'manifest': manifest,
+            'manifest_mtime': _manifest_stamp(gadget_path),
+            'installed_at': time.time(),
+        }
+        self.changed.add(gadget_id)
+        if save:
+            self.save()
+
+    def remove(self, gadget_id):
+        if self.entries.pop(gadget_id, None) is not None:
+            self.changed.add(gadget_id)
+            self.save()
+
+
+def is_installed(gadgets_dir, gadget_id):
+    return (os.path.exists(os.path.join(gadgets_dir, gadget_id))
+            or os.path.exists(os.path.join(gadgets_dir, gadget_id + '.zip')))
+
+
+def _hash_pyc(source, filename):
+    """
+    compile to an unchecked hash-based pyc: zipimport load it without comparing
+    timestamps, the archive is only ever replaced as a whole by the installer
+    """
+    code = compile(source, filename, 'exec', dont_inherit=True)
+    return (importlib.util.MAGIC_NUMBER + (0b01).to_bytes(4, 'little')
+            + importlib.util.source_hash(source) + marshal.dumps(code))
+
+
+@metrics.timed('gsf_install_seconds', mode='archive')
+def install_archive(package_path, gadgets_dir=GADGETS_DIR, registry=None):
+    """
+    install a package without extracting it: the .zip itself become the installed gadget
+    the code is imported through zipimport, .pyc are added next to each source
+    """
+    os.makedirs(gadgets_dir, exist_ok=True)
+    registry = registry if registry is not None else GadgetRegistry()
+    gadget_id = os.path.splitext(os.path.basename(package_path))[0]
+    if is_installed(gadgets_dir, gadget_id):
+        raise InstallError(f"The gadget named {gadget_id} has aleady existed, please uninstall firstly!")
+
+    target_path = os.path.join(gadgets_dir, gadget_id + '.zip')
+    tmp_path = os.path.join(gadgets_dir, f".install-{gadget_id}.zip")
+    try:
+        manifest = _build_archive(package_path, tmp_path, target_path)
+        os.replace(tmp_path, target_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    registry.add(gadget_id, target_path, manifest)
+    metrics.inc('gsf_installs', mode='archive')
+    return gadget_id
+
+
+def _build_archive(package_path, tmp_path, target_path):
+    """copy the package to tmp_path with a .pyc next to each source, Return: its manifest"""
+    shutil.copyfile(package_path, tmp_path)
+    manifest = _load_archive_manifest(tmp_path)
+    with zipfile.ZipFile(tmp_path, 'a') as zip_ref:
+        names = set(zip_ref.namelist())
+        for name in sorted(names):
+            if not name.endswith('.py') or name + 'c' in names:
+                continue
+            try:
+                pyc = _hash_pyc(zip_ref.read(name), os.path.join(target_path, name))
+            except SyntaxError as e:
+                raise InstallError(f"Cannot compile {name}: {e}")
+            # stored, zipimport then read it straight from the mapping
+            zip_ref.writestr(name + 'c', pyc, compress_type=zipfile.ZIP_STORED)
+    return manifest
+
+
+def _stage_package(package_path, gadgets_dir, prefix='.install-', update=False):
+    """
+    extract a package into a hidden staging dir of gadgets_dir and validate it
+    update: the gadget must already be installed instead of must not
+    Return: (gadget_id, staged gadget path, staging dir, manifest)
+    """
+    gadget_id = os.path.splitext(os.path.basename(package_path))[0]
+    staging_dir = tempfile.mkdtemp(prefix=prefix, dir=gadgets_dir)
+    try:
+        with zipfile.ZipFile(package_path, 'r') as zip_ref:
+            zip_ref.extractall(staging_dir)
+
+        if os.path.exists(os.path.join(staging_dir, MANIFEST_FILE)):
+            # flat package, gadget.json at the archive root
+            staged_path = staging_dir
+        else:
+            entries = os.listdir(staging_dir)
+            if gadget_id not in entries:
+                if len(entries) != 1:
+                    raise InstallError(f"Package must contain a root folder named '{gadget_id}'")
+                gadget_id = entries[0]
+            staged_path = os.path.join(staging_dir, gadget_id)
+
+        if update and not is_installed(gadgets_dir, gadget_id):
+            raise InstallError(f"The gadget named {gadget_id} is not installed, nothing to update")
+        if not update and is_installed(gadgets_dir, gadget_id):
+            raise InstallError(f"The gadget named {gadget_id} has aleady existed, please uninstall firstly!")
+
+        manifest = load_manifest(staged_path)
+        return gadget_id, staged_path, staging_dir, manifest
+    except Exception:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+
+
+@metrics.timed('gsf_install_seconds', mode='batch')
+def install_packages(package_paths, gadgets_dir=GADGETS_DIR, registry=None, workers=None, blob_store=None):
+    """
+    batch install: validate every package, precompile all of them in one go, then move them in place
+    blob_store: when given, the gadget files are deduplicated through it
+    Return: [(package_path, gadget_id or the exception which make it fail), ...]
+    """
+    os.makedirs(gadgets_dir, exist_ok=True)
+    registry = registry if registry is not None else GadgetRegistry()
+    results = []
+    staged = []  # (package_path, gadget_id, staged_path, staging_dir, manifest)
+
+    for package_path in package_paths:
+        try:
+            staged.append((package_path, *_stage_package(package_path, gadgets_dir)))
+        except Exception as e:
+            results.append((package_path, e))
+
+    errors = precompile_sources([item[2] for item in staged], workers)
+
+    for package_path, gadget_id, staged_path, staging_dir, manifest in staged:
+        try:
+            failed = [path for path in errors if path.startswith(staged_path + os.sep)]
+            if failed:
+                raise InstallError(f"Cannot compile {os.path.relpath(failed[0], staged_path)}: {errors[failed[0]]}")
+            target_path = os.path.join(gadgets_dir, gadget_id)
+            if is_installed(gadgets_dir, gadget_id):
+                # two packages of the batch carry the same gadget
+                raise InstallError(f"The gadget named {gadget_id} has aleady existed, please uninstall firstly!")
+            if blob_store is not None:
+                report = blob_store.import_tree(gadget_id, staged_path)
+                print(f"{gadget_id}: {report['files']} files linked from the blob store, "
+                      f"{report['deduplicated_bytes']} bytes deduplicated")
+            try:
+                os.rename(staged_path, target_path)
+            except OSError:
+                if blob_store is not None:
+                    blob_store.release(gadget_id)
+                raise
+            registry.add(gadget_id, target_path, manifest, save=False)
+            results.append((package_path, gadget_id))
+        except Exception as e:
+            results.append((package_path, e))
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    registry.save()
+    failures = sum(1 for _, result in results if isinstance(result, Exception))
+    metrics.inc('gsf_installs', len(results) - failures, mode='extracted')
+    metrics.inc('gsf_install_failures', failures)
+    return results
+
+
+def install_package(package_path, gadgets_dir=GADGETS_DIR, registry=None, workers=None, keep_archive=False, blob_store=None):
+    """install one gadget package, raise InstallError when it cannot be installed"""
+    if keep_archive:
+        return install_archive(package_path, gadgets_dir, registry)
+    result = install_packages([package_path], gadgets_dir, registry, workers, blob_store)[0][1]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+# --- updates ---
+def _tree_files(gadget_path):
+    """{ relative path: absolute path } of the gadget files, bytecode caches left out"""
+    files = {}
+    for root, dirs, names in os.walk(gadget_path):
+        dirs[:] = [d for d in dirs if d != '__pycache__']
+        for name in names:
+            path = os.path.join(root, name)
+            files[os.path.relpath(path, gadget_path)] = path
+    return files
+
+
+def _member_relpath(name):
+    """package member name -> relative os path, None for what must not be written"""
+    path = posixpath.normpath(name)
+    if path == '..' or path.startswith('../') or posixpath.isabs(path) or ':' in path:
+        return None
+    parts = path.split('/')
+    if '__pycache__' in parts:
+        return None
+    return os.path.join(*parts)
+
+
+def _hash_member(zip_ref, info):
+    digest = hashlib.sha256()
+    with zip_ref.open(info) as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _link_or_copy(source, dest):
+    """Return: bytes written, 0 when the file could be hardlinked"""
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    try:
+        os.link(source, dest)
+        return 0
+    except OSError:
+        shutil.copyfile(source, dest)
+        return os.path.getsize(dest)
+
+
+def _update_key(gadget_id):
+    """blob store owner of the files of a prepared update"""
+    return UPDATE_OWNER_PREFIX + gadget_id
+
+
+def remove_stale_staging(gadgets_dir=GADGETS_DIR):
+    """best-effort removal of the old folders that applied updates could not delete"""
+    try:
+        names = os.listdir(gadgets_dir)
+    except OSError:
+        return
+    for name in names:
+        staging_dir = os.path.join(gadgets_dir, name)
+        # an applied update leave only the previous folder behind, a pending one its staged copy
+        if name.startswith(UPDATE_OWNER_PREFIX) and os.path.isdir(staging_dir) and os.listdir(staging_dir) == ['.previous']:
+            try:
+                remove_tree(staging_dir)
+            except OSError as e:
+                print(f"Cannot remove {staging_dir}: {e}")
+
+
+def prepare_update(package_path, gadgets_dir=GADGETS_DIR, workers=None, blob_store=None):
+    """
+    build the new version of an installed gadget next to the installed one, which keep running:
+    files whose hash did not change (and their bytecode) are hardlinked from the installed gadget,
+    only the changed ones are written and compiled
+    Return: update dict for apply_update/discard_update, it report the 'files', 'changed'
+    and 'removed' counts, 'bytes_written' and the 'old_version'/'new_version'
+    """
+    gadget_id = os.path.splitext(os.path.basename(package_path))[0]
+    if archive.is_archive_gadget(os.path.join(gadgets_dir, gadget_id + '.zip')):
+        return _prepare_archive_update(package_path, gadgets_dir, gadget_id)
+
+    manifest = _load_archive_manifest(package_path)
+    with zipfile.ZipFile(package_path, 'r') as zip_ref:
+        root = archive.find_archive_root(set(zip_ref.namelist()))
+    if root:
+        gadget_id = root.rstrip('/')
+    target_path = os.path.join(gadgets_dir, gadget_id)
+    if not os.path.isdir(target_path):
+        raise InstallError(f"The gadget named {gadget_id} is not installed, nothing to update")
+
+    remove_stale_staging(gadgets_dir)
+    staging_dir = tempfile.mkdtemp(prefix=UPDATE_OWNER_PREFIX, dir=gadgets_dir)
+    update = {
+        'gadget_id': gadget_id, 'kind': 'tree', 'manifest': manifest,
+        'target_path': target_path, 'staging_dir': staging_dir,
+        'staged_path': os.path.join(staging_dir, gadget_id),
+        'old_version': load_manifest(target_path)['version'], 'new_version': manifest['version'],
+        'files': 0, 'changed': 0, 'removed': 0, 'bytes_written': 0,
+    }
+    try:
+        old_files = _tree_files(target_path)
+        seen = set()
+        to_compile = []
+        with zipfile.ZipFile(package_path, 'r') as zip_ref:
+            for info in zip_ref.infolist():
+                if info.is_dir() or not info.filename.startswith(root):
+                    continue
+                relpath = _member_relpath(info.filename[len(root):])
+                if relpath is None:
+                    continue
+                seen.add(relpath)
+                update['files'] += 1
+                dest = os.path.join(update['staged_path'], relpath)
+                old = old_files.get(relpath)
+                if (old and os.path.getsize(old) == info.file_size
+                        and hash_file(old) == _hash_member(zip_ref, info)):
+                    update['bytes_written'] += _link_or_copy(old, dest)
+                    if relpath.endswith('.py'):
+                        # checked-hash bytecode, still valid for the same source
+                        old_pyc = importlib.util.cache_from_source(old)
+                        if os.path.exists(old_pyc):
+                            update['bytes_written'] += _link_or_copy(old_pyc, importlib.util.cache_from_source(dest))
+                        else:
+                            to_compile.append(dest)
+                    continue
+                update['changed'] += 1
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                with zip_ref.open(info) as src, open(dest, 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                update['bytes_written'] += info.file_size
+                if relpath.endswith('.py'):
+                    to_compile.append(dest)
+        update['removed'] = len(set(old_files) - seen - PRESERVED_FILES)
+
+        errors = compile_sources(to_compile, workers)
+        if errors:
+            failed = next(iter(errors))
+            raise InstallError(f"Cannot compile {os.path.relpath(failed, update['staged_path'])}: {errors[failed]}")
+        if blob_store is not None:
+            blob_store.import_tree(_update_key(gadget_id), update['staged_path'])
+    except Exception:
+        discard_update(update, blob_store)
+        raise
+    return update
+
+
+def _prepare_archive_update(package_path, gadgets_dir, gadget_id):
+    """an archive is replaced as a whole, the counts compare the members CRC"""
+    target_path = os.path.join(gadgets_dir, gadget_id + '.zip')
+    staged_path = os.path.join(gadgets_dir, f".update-{gadget_id}.zip")
+    try:
+        manifest = _build_archive(package_path, staged_path, target_path)
+        with zipfile.ZipFile(target_path, 'r') as old_zip, zipfile.ZipFile(staged_path, 'r') as new_zip:
+            old_crcs = {info.filename: info.CRC for info in old_zip.infolist() if not info.filename.endswith('.pyc')}
+            new_crcs = {info.filename: info.CRC for info in new_zip.infolist() if not info.filename.endswith('.pyc')}
+    except Exception:
+        if os.path.exists(staged_path):
+            os.remove(staged_path)
+        raise
+    return {
+        'gadget_id': gadget_id, 'kind': 'archive', 'manifest': manifest,
+        'target_path': target_path, 'staging_dir': None, 'staged_path': staged_path,
+        'old_version': _load_archive_manifest(target_path)['version'], 'new_version': manifest['version'],
+        'files': len(new_crcs),
+        'changed': sum(1 for name, crc in new_crcs.items() if old_crcs.get(name) != crc),
+        'removed': len(set(old_crcs) - set(new_crcs)),
+        'bytes_written': os.path.getsize(staged_path),
+    }
+
+
+def is_up_to_date(update):
+    return not update['changed'] and not update['removed']
+
+
+@metrics.timed('gsf_update_swap_seconds')
+def apply_update(update, registry=None, blob_store=None):
+    """
+    swap the prepared copy in, the gadget must not be running (its files may be held open)
+    a gadget folder is moved aside and the new one renamed in its place, the old one is put back
+    if the second rename fail; an archive is replaced by a single os.replace
+    once swapped the update is applied: the old folder is only removed on a best-effort basis
+    """
+    registry = registry if registry is not None else GadgetRegistry()
+    gadget_id = update['gadget_id']
+    target_path = update['target_path']
+    try:
+        if update['kind'] == 'archive':
+            os.replace(update['staged_path'], target_path)
+        else:
+            for name in PRESERVED_FILES:
+                path = os.path.join(target_path, name)
+                dest = os.path.join(update['staged_path'], name)
+                if os.path.exists(path) and not os.path.exists(dest):
+                    # copied last, so the settings the gadget saved while closing are kept
+                    shutil.copyfile(path, dest)
+                    update['bytes_written'] += os.path.getsize(path)
+            previous_path = os.path.join(update['staging_dir'], '.previous')
+            os.rename(target_path, previous_path)
+            try:
+                os.rename(update['staged_path'], target_path)
+            except OSError:
+                os.rename(previous_path, target_path)
+                raise
+            if blob_store is not None:
+                blob_store.transfer(_update_key(gadget_id), gadget_id)
+        registry.add(gadget_id, target_path, update['manifest'])
+    except BaseException:
+        discard_update(update, blob_store)
+        raise
+    metrics.inc('gsf_updates', mode=update['kind'])
+    metrics.inc('gsf_update_bytes_written', update['bytes_written'])
+    try:
+        discard_update(update, blob_store)
+    except OSError as e:
+        # e.g. a file of the old folder still open on windows, the next update remove it
+        print(f"Cannot remove the previous files of {gadget_id}, left in {update['staging_dir']}: {e}")
+
+
+def discard_update(update, blob_store=None):
+    """drop what prepare_update staged, nothing once apply_update swapped it in"""
+    if update['kind'] == 'archive':
+        if os.path.exists(update['staged_path']):
+            os.remove(update['staged_path'])
+        return
+    if blob_store is not None:
+        # a no-op once transferred, the in-memory index may be older than the file
+        blob_store.release(_update_key(update['gadget_id']))
+    remove_tree(update['staging_dir'])
+
+
+def update_package(package_path, gadgets_dir=GADGETS_DIR, registry=None, workers=None, blob_store=None):
+    """prepare and apply the update of a stopped gadget, Return: the update report"""
+    update = prepare_update(package_path, gadgets_dir, workers, blob_store)
+    if is_up_to_date(update):
+        discard_update(update, blob_store)
+    else:
+        apply_update(update, registry, blob_store)
+    return update
+
+
+def measure_launch_time(gadget_path, repeat=3, timeout=60.0):
+    """
+    launch a copy of the gadget as the manager do (python -m gsf.launcher), in a throwaway
+    data dir, and time until its first heartbeat: the process is up, the code imported and
+    the gadget built; without any cached bytecode (every launch before install-time
+    precompilation) then with the bytecode compiled at install time
+    Return: {'source_ms': best, 'bytecode_ms': best, 'files': number of sources}, in milliseconds
+    """
+    from gsf.watchdog import heartbeat_file
+
+    manifest = load_manifest(gadget_path)
+    gadget_id = os.path.basename(os.path.normpath(gadget_path))
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    timings = {}
+    with tempfile.TemporaryDirectory(prefix='gsf-launch-') as data_dir:
+        copy_path = os.path.join(data_dir, 'gadgets', gadget_id)
+        shutil.copytree(gadget_path, copy_path, ignore=shutil.ignore_patterns('__pycache__'))
+        entry_point = os.path.join(copy_path, manifest['entry_point'])
+        sources = find_sources(copy_path)
+
+        env = dict(os.environ, APPDATA=data_dir)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [package_root, env.get('PYTHONPATH')]))
+        # no window on the desktop of whoever measure
+        env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        heartbeat = heartbeat_file(gadget_id, os.path.join(data_dir, 'GSF', 'heartbeats'))
+
+        def launch(run_env):
+            if os.path.exists(heartbeat):
+                os.remove(heartbeat)
+            start = time.perf_counter()
+            process = subprocess.Popen([sys.executable, '-m', 'gsf.launcher', entry_point, copy_path], env=run_env,
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                while not os.path.exists(heartbeat):
+                    if process.poll() is not None:
+                        raise InstallError(f"{gadget_id} exited with code {process.returncode} before its first heartbeat")
+                    if time.perf_counter() - start > timeout:
+                        raise InstallError(f"{gadget_id} sent no heartbeat within {timeout:.0f} s")
+                    time.sleep(0.005)
+                return (time.perf_counter() - start) * 1000.0
+            finally:
+                process.kill()
+                process.wait()
+
+        # nothing cached nor written, every launch compile the gadget sources
+        source_env = dict(env, PYTHONDONTWRITEBYTECODE='1')
+        timings['source_ms'] = min(launch(source_env) for _ in range(repeat))
+        precompile_sources([copy_path], workers=1)
+        timings['bytecode_ms'] = min(launch(env) for _ in range(repeat))
+    timings['files'] = len(sources)
+    return timings
+
+
+def _disk_usage(path):
+    """Return: (file count, allocated bytes)"""
+    paths = [path] if os.path.isfile(path) else [
+        os.path.join(root, name) for root, _, files in os.walk(path) for name in files]
+    allocated = 0
+    for file_path in paths:
+        stat = os.stat(file_path)
+        # st_blocks count the real allocation (small files waste most of a block), not on Windows
+        allocated += stat.st_blocks * 512 if hasattr(stat, 'st_blocks') else stat.st_size
+    return len(paths), allocated
+
+
+def compare_install_modes(package_path, repeat=3):
+    """install the package extracted and as archive into throwaway dirs, compare time and disk usage"""
+    report = {}
+    for mode, keep_archive in (('extracted', False), ('archive', True)):
+        best = None
+        for _ in range(repeat):
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                gadgets_dir = os.path.join(tmp_dir, 'gadgets')
+                registry = GadgetRegistry(os.path.join(tmp_dir, 'installed.json'))
+                start = time.perf_counter()
+                gadget_id = install_package(package_path, gadgets_dir, registry, workers=1, keep_archive=keep_archive)
+                elapsed = (time.perf_counter() - start) * 1000.0
+                files, allocated = _disk_usage(registry.entries[gadget_id]['path'])
+            best = elapsed if best is None else min(best, elapsed)
+        report[mode] = {'install_ms': best, 'files': files, 'disk_bytes': allocated}
+    return report
+
+
+def main(argv=None):
+    """gsf-install command line entry point"""
+    parser = argparse.ArgumentParser(prog='gsf-install', description="Install GSF gadget packages.")
+    parser.add_argument('packages', nargs='*', help="gadget .zip packages")
+    parser.add_argument('--gadgets-dir', default=GADGETS_DIR)
+    parser.add_argument('--workers', type=int, default=None, help="compile processes, default: cpu count")
+    parser.add_argument('--archive', action='store_true', help="keep the .zip as the installed gadget, don't extract it")
+    parser.add_argument('--update', action='store_true', help="update installed (stopped) gadgets, only changed files are written")
+    parser.add_argument('--no-dedup', action='store_true', help="don't link the gadget files from the blob store")
+    parser.add_argument('--measure', metavar='GADGET_DIR', help="measure the launch time of a gadget without and with precompiled bytecode")
+    parser.add_argument('--compare-install', metavar='PACKAGE', help="compare extracted vs archive install time and disk usage")
+    args = parser.parse_args(argv)
+
+    if args.compare_install:
+        for mode, result in compare_install_modes(args.compare_install).items():
+            print(f"{mode}: {result['install_ms']:.1f} ms, {result['files']} files, {result['disk_bytes']} bytes on disk")
+        return 0
+
+    if args.measure:
+        timings = measure_launch_time(args.measure)
+        print(f"{timings['files']} source files, launch to first heartbeat: "
+              f"{timings['source_ms']:.0f} ms compiling the sources, {timings['bytecode_ms']:.0f} ms with precompiled bytecode")
+        return 0
+
+    exit_code = 0
+    registry = GadgetRegistry(os.path.join(os.path.dirname(args.gadgets_dir), 'config', 'installed.json'))
+    if args.update:
+        blob_store = None if args.no_dedup else BlobStore(os.path.join(os.path.dirname(args.gadgets_dir), 'blobs'))
+        for package_path in args.packages:
+            try:
+                report = update_package(package_path, args.gadgets_dir, registry, args.workers, blob_store)
+            except Exception as e:
+                print(f"Update FAILED: {package_path}: {e}")
+                exit_code = 1
+                continue
+            print(f"Updated {report['gadget_id']} {report['old_version']} -> {report['new_version']}: "
+                  f"{report['changed']}/{report['files']} files changed, {report['removed']} removed, "
+                  f"{report['bytes_written']} bytes written")
+        return exit_code
+    if args.archive:
+        results = []
+        for package_path in args.packages:
+            try:
+                results.append((package_path, install_archive(package_path, args.gadgets_dir, registry)))
+            except Exception as e:
+                results.append((package_path, e))
+    else:
+        blob_store = None if args.no_dedup else BlobStore(os.path.join(os.path.dirname(args.gadgets_dir), 'blobs'))
+        results = install_packages(args.packages, args.gadgets_dir, registry, args.workers, blob_store)
+    for package_path, result in results:
+        if isinstance(result, Exception):
+            print(f"Install FAILED: {package_path}: {result}")
+            exit_code = 1
+        else:
+            print(f"Installed {result} from {package_path}")
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,71 @@
+import os
+import sys
+import types
+import zipfile
+import zipimport
+import importlib.util
+
+from gsf.archive import is_archive_gadget, find_archive_root
+
+
+def run_entry_point(entry_point, gadget_path):
+    """
+    run the gadget entry point as __main__ through the import system,
+    unlike `python main.py` this use the bytecode precompiled at install time
+    """
+    sys.argv = [entry_point, gadget_path]
+    load_entry_module(entry_point, gadget_path, '__main__')
+
+
+def load_entry_module(entry_point, gadget_path, module_name):
+    """
+    import the gadget entry point under module_name, with its folder on sys.path
+    as `python main.py` would do, used as '__main__' by run_entry_point
+    and under a private name by the desktop layer host
+    """
+    entry_point = os.path.abspath(entry_point)
+    if is_archive_gadget(gadget_path):
+        entry_point = resolve_archive_entry_point(entry_point, gadget_path)
+    sys.path.insert(0, os.path.dirname(entry_point))
+
+    if is_archive_gadget(gadget_path):
+        return load_archive_entry_module(entry_point, module_name)
+
+    spec = importlib.util.spec_from_file_location(module_name, entry_point)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def resolve_archive_entry_point(entry_point, gadget_path):
+    """<gadget.zip>/main.py -> <gadget.zip>/<root folder holding gadget.json>/main.py"""
+    gadget_path = os.path.abspath(gadget_path)
+    with zipfile.ZipFile(gadget_path, 'r') as zip_ref:
+        root = find_archive_root(set(zip_ref.namelist()))
+    relative = os.path.relpath(entry_point, gadget_path)
+    return os.path.join(gadget_path, root, relative) if root else entry_point
+
+
+def load_archive_entry_module(entry_point, module_name):
+    """
+    entry_point look like <gadget.zip>/<root>/main.py, the code (and the .pyc added
+    at install time) is loaded by zipimport, helper modules import the same way
+    as the archive folder is on sys.path
+    """
+    importer = zipimport.zipimporter(os.path.dirname(entry_point))
+    code = importer.get_code(os.path.splitext(os.path.basename(entry_point))[0])
+
+    module = types.ModuleType(module_name)
+    module.__file__ = entry_point
+    module.__loader__ = importer
+    sys.modules[module_name] = module
+    exec(code, module.__dict__)
+    return module
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print("Usage: python -m gsf.launcher <entry_point> <gadget_path>")
+        sys.exit(1)
+    run_entry_point(sys.argv[1], sys.argv[2])
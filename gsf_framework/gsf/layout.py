@@ -0,0 +1,306 @@
+import os
+
+from gsf.appdata import APP_DATA_PATH, read_json, write_json_atomic
+
+# every running gadget publish its rect in <id>.rect.json, the manager ask it to move with <id>.move.json
+LAYOUT_DIR = os.path.join(APP_DATA_PATH, 'config', 'layout')
+SETTINGS_FILE_NAME = 'settings.json'
+RECT_SUFFIX = '.rect.json'
+DEFAULT_SETTINGS = {
+    'snap': True,          # snap to screen edges and neighbour gadgets while dragging
+    'no_overlap': False,   # push a dropped gadget to the nearest free place
+    'snap_distance': 12,   # in pixels
+    'margin': 8,           # gap kept by auto-arrange and no-overlap placement
+}
+
+GRID_CELL_SIZE = 256
+
+
+# rects are (x, y, width, height) tuples, right/bottom are exclusive
+def intersects(a, b):
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+
+def inflate(rect, amount):
+    return (rect[0] - amount, rect[1] - amount, rect[2] + 2 * amount, rect[3] + 2 * amount)
+
+
+def contains(outer, inner):
+    return (inner[0] >= outer[0] and inner[1] >= outer[1]
+            and inner[0] + inner[2] <= outer[0] + outer[2] and inner[1] + inner[3] <= outer[1] + outer[3])
+
+
+class SpatialIndex:
+    """
+    uniform grid over the virtual desktop, a rect is registered in every cell it cover
+    so a query only look at the gadgets around it, not at all of them
+    """
+    def __init__(self, cell_size=GRID_CELL_SIZE):
+        self.cell_size = cell_size
+        self.rects = {}  # { 'gadget_id': rect }
+        self.cells = {}  # { (cx, cy): {'gadget_id', ...} }
+
+    def _cells_of(self, rect):
+        size = self.cell_size
+        for cx in range(rect[0] // size, (rect[0] + max(rect[2], 1) - 1) // size + 1):
+            for cy in range(rect[1] // size, (rect[1] + max(rect[3], 1) - 1) // size + 1):
+                yield (cx, cy)
+
+    def insert(self, gadget_id, rect):
+        self.remove(gadget_id)
+        rect = tuple(int(v) for v in rect)
+        self.rects[gadget_id] = rect
+        for cell in self._cells_of(rect):
+            self.cells.setdefault(cell, set()).add(gadget_id)
+
+    def remove(self, gadget_id):
+        rect = self.rects.pop(gadget_id, None)
+        if rect is None:
+            return
+        for cell in self._cells_of(rect):
+            members = self.cells.get(cell)
+            if members:
+                members.discard(gadget_id)
+                if not members:
+                    del self.cells[cell]
+
+    def query(self, rect, exclude=None):
+        """Return: ids of the gadgets intersecting rect"""
+        found = set()
+        for cell in self._cells_of(rect):
+            found.update(self.cells.get(cell, ()))
+        found.discard(exclude)
+        return {gid for gid in found if intersects(self.rects[gid], rect)}
+
+    def __len__(self):
+        return len(self.rects)
+
+
+def _best_offset(candidates, distance):
+    best = None
+    for offset in candidates:
+        if abs(offset) <= distance and (best is None or abs(offset) < abs(best)):
+            best = offset
+    return best or 0
+
+
+class LayoutEngine:
+    """
+    snap/no-overlap/auto-arrange over the rects of all gadgets
+    screens: list of available screen rects (without the taskbar)
+    """
+    def __init__(self, screens, settings=None):
+        self.screens = [tuple(int(v) for v in screen) for screen in screens]
+        self.settings = dict(DEFAULT_SETTINGS, **(settings or {}))
+        self.index = SpatialIndex()
+
+    def screen_of(self, rect):
+        """the screen holding the rect center, the first one when it is off screen"""
+        cx, cy = rect[0] + rect[2] // 2, rect[1] + rect[3] // 2
+        for screen in self.screens:
+            if contains(screen, (cx, cy, 0, 0)):
+                return screen
+        return self.screens[0] if self.screens else None
+
+    def snap(self, gadget_id, rect):
+        """Return: (x, y) of rect moved onto the close screen edges / neighbour edges"""
+        if not self.settings['snap']:
+            return rect[0], rect[1]
+        x, y, w, h = rect
+        distance = self.settings['snap_distance']
+        margin = self.settings['margin']
+        dx_candidates, dy_candidates = [], []
+
+        screen = self.screen_of(rect)
+        if screen:
+            sx, sy, sw, sh = screen
+            dx_candidates += [sx - x, sx + sw - (x + w)]
+            dy_candidates += [sy - y, sy + sh - (y + h)]
+
+        for other_id in self.index.query(inflate(rect, distance + margin), exclude=gadget_id):
+            ox, oy, ow, oh = self.index.rects[other_id]
+            # side by side (leaving the margin) or aligned on the same edge
+            dx_candidates += [ox + ow + margin - x, ox - margin - (x + w), ox - x, ox + ow - (x + w)]
+            dy_candidates += [oy + oh + margin - y, oy - margin - (y + h), oy - y, oy + oh - (y + h)]
+
+        return x + _best_offset(dx_candidates, distance), y + _best_offset(dy_candidates, distance)
+
+    def is_free(self, gadget_id, rect):
+        return not self.index.query(inflate(rect, self.settings['margin'] - 1), exclude=gadget_id)
+
+    def find_free_position(self, gadget_id, rect, max_rounds=4):
+        """
+        Return: the closest (x, y) around rect where the gadget does not overlap any other one,
+        rect position itself when it is free or when nothing free is found nearby
+        """
+        if not self.settings['no_overlap'] or self.is_free(gadget_id, rect):
+            return rect[0], rect[1]
+        x, y, w, h = rect
+        margin = self.settings['margin']
+        screen = self.screen_of(rect)
+        frontier = [rect]
+        seen = set()
+        for _ in range(max_rounds):
+            candidates = []
+            for blocked in frontier:
+                for other_id in self.index.query(inflate(blocked, margin - 1), exclude=gadget_id):
+                    ox, oy, ow, oh = self.index.rects[other_id]
+                    candidates += [(ox + ow + margin, y), (ox - margin - w, y),
+                                   (x, oy + oh + margin), (x, oy - margin - h)]
+            candidates = [c for c in candidates if c not in seen]
+            seen.update(candidates)
+            candidates.sort(key=lambda c: (c[0] - x) ** 2 + (c[1] - y) ** 2)
+            frontier = []
+            for cx, cy in candidates:
+                candidate = (cx, cy, w, h)
+                if screen and not contains(screen, candidate):
+                    continue
+                if self.is_free(gadget_id, candidate):
+                    return cx, cy
+                frontier.append(candidate)
+            if not frontier:
+                break
+        return x, y
+
+    def auto_arrange(self, gadget_ids=None):
+        """
+        pack the gadgets in columns from the top-right corner of their screen, like the old sidebar
+        Return: { 'gadget_id': (x, y) }
+        """
+        gadget_ids = sorted(gadget_ids if gadget_ids is not None else self.index.rects)
+        margin = self.settings['margin']
+        by_screen = {}
+        for gadget_id in gadget_ids:
+            rect = self.index.rects[gadget_id]
+            by_screen.setdefault(self.screen_of(rect), []).append(gadget_id)
+
+        positions = {}
+        for screen, members in by_screen.items():
+            sx, sy, sw, sh = screen or (0, 0, 1920, 1080)
+            column_right = sx + sw - margin
+            column_width = 0
+            y = sy + margin
+            for gadget_id in members:
+                _, _, w, h = self.index.rects[gadget_id]
+                if y + h > sy + sh - margin and column_width:
+                    # column full, start a new one on the left
+                    column_right -= column_width + margin
+                    column_width = 0
+                    y = sy + margin
+                    if column_right - w < sx:
+                        # screen full, overlapping can't be avoided anymore, start over
+                        column_right = sx + sw - margin
+                positions[gadget_id] = (column_right - w, y)
+                column_width = max(column_width, w)
+                y += h + margin
+
+        for gadget_id, (x, y) in positions.items():
+            _, _, w, h = self.index.rects[gadget_id]
+            self.index.insert(gadget_id, (x, y, w, h))
+        return positions
+
+    @classmethod
+    def from_layout_dir(cls, screens, layout_dir=LAYOUT_DIR, exclude=None):
+        engine = cls(screens, load_settings(layout_dir))
+        for gadget_id, rect in read_rects(layout_dir).items():
+            if gadget_id != exclude:
+                engine.index.insert(gadget_id, rect)
+        return engine
+
+
+# --- layout dir, shared by the gadget processes and the manager ---
+
+
+def load_settings(layout_dir=LAYOUT_DIR):
+    return dict(DEFAULT_SETTINGS, **(read_json(os.path.join(layout_dir, SETTINGS_FILE_NAME)) or {}))
+
+
+def save_settings(settings, layout_dir=LAYOUT_DIR):
+    write_json_atomic(os.path.join(layout_dir, SETTINGS_FILE_NAME), dict(load_settings(layout_dir), **settings), indent=None)
+
+
+def write_rect(gadget_id, rect, layout_dir=LAYOUT_DIR):
+    write_json_atomic(os.path.join(layout_dir, gadget_id + RECT_SUFFIX), list(rect), indent=None)
+
+
+def remove_rect(gadget_id, layout_dir=LAYOUT_DIR):
+    """the gadget stopped, it doesn't take any room anymore"""
+    try:
+        os.remove(os.path.join(layout_dir, gadget_id + RECT_SUFFIX))
+    except OSError:
+        pass
+
+
+class RectCache:
+    """
+    rects of the layout dir, only read again when they change: every write is an atomic
+    rename, which bump the mtime of the dir, and the rewritten file get a new mtime
+    """
+    def __init__(self, layout_dir=LAYOUT_DIR):
+        self.layout_dir = layout_dir
+        self.dir_mtime = None
+        self.files = {}  # { 'gadget_id': (mtime_ns, rect) }
+
+    def rects(self):
+        try:
+            dir_mtime = os.stat(self.layout_dir).st_mtime_ns
+        except OSError:
+            self.dir_mtime, self.files = None, {}
+            return {}
+        if dir_mtime != self.dir_mtime:
+            # stat before listing: a change in between is seen again at the next call
+            self.dir_mtime = dir_mtime
+            files = {}
+            for name in os.listdir(self.layout_dir):
+                if not name.endswith(RECT_SUFFIX):
+                    continue
+                gadget_id = name[:-len(RECT_SUFFIX)]
+                path = os.path.join(self.layout_dir, name)
+                try:
+                    mtime = os.stat(path).st_mtime_ns
+                except OSError:
+                    continue
+                cached = self.files.get(gadget_id)
+                if cached and cached[0] == mtime:
+                    files[gadget_id] = cached
+                    continue
+                rect = read_json(path)
+                if rect and len(rect) == 4:
+                    files[gadget_id] = (mtime, tuple(rect))
+            self.files = files
+        return {gadget_id: rect for gadget_id, (_, rect) in self.files.items()}
+
+
+_rect_caches = {}  # { layout_dir: RectCache }
+
+
+def read_rects(layout_dir=LAYOUT_DIR):
+    """Return: { 'gadget_id': rect } of the running gadgets"""
+    cache = _rect_caches.get(layout_dir)
+    if cache is None:
+        cache = _rect_caches[layout_dir] = RectCache(layout_dir)
+    return cache.rects()
+
+
+def request_move(gadget_id, pos, layout_dir=LAYOUT_DIR):
+    write_json_atomic(os.path.join(layout_dir, f"{gadget_id}.move.json"), list(pos), indent=None)
+
+
+def take_move_request(gadget_id, layout_dir=LAYOUT_DIR):
+    """Return: the (x, y) the manager asked for and forget it, None if there is none"""
+    path = os.path.join(layout_dir, f"{gadget_id}.move.json")
+    if not os.path.exists(path):
+        return None
+    pos = read_json(path)
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    return tuple(pos) if pos and len(pos) == 2 else None
+
+
+def forget(gadget_id, layout_dir=LAYOUT_DIR):
+    for suffix in (RECT_SUFFIX, '.move.json'):
+        path = os.path.join(layout_dir, gadget_id + suffix)
+        if os.path.exists(path):
+            os.remove(path)
@@ -1,23 +1,49 @@
 import sys
 import os
+import time
+# origin of the tray start up trace, before the Qt and gsf imports
+_PROCESS_START = time.perf_counter()
 import json
+import functools
 import subprocess
-from threading import Timer
+from threading import Timer, RLock
 from PySide6.QtWidgets import *
 from PySide6.QtGui import *
+from PySide6.QtCore import QTimer
 
-# Define app name which used as folder name
-APP_NAME = "GSF"
+from gsf import profiler
+from gsf import layout
+from gsf import watchdog
+from gsf import metrics
+# installer, archive, blobstore, catalog and desktop_layer pull in zipfile, the process pools,
+# urllib and the gadget widgets; they are imported where used, the tray does not wait for them
 
-# Get the user-specific Application Data Dir
-APP_DATA_PATH = os.path.join(os.getenv('APPDATA'), APP_NAME)
+# app name and the user-specific Application Data Dir
+from gsf.appdata import APP_NAME, APP_DATA_PATH, CONFIG_DIR, read_json
 
 # Define all important sub dirs
 GADGETS_DIR = os.path.join(APP_DATA_PATH, 'gadgets')
-CONFIG_DIR = os.path.join(APP_DATA_PATH, 'config')
 SESSION_FILE = os.path.join(CONFIG_DIR, 'session.json')
+INSTALLED_FILE = os.path.join(CONFIG_DIR, 'installed.json')
+BLOBS_DIR = os.path.join(APP_DATA_PATH, 'blobs')
 DEFAULT_ICON = os.path.join(os.path.dirname(__file__), 'assets', 'icon.png')
 
+# interpreter of the gadget processes: the one on PATH when the manager is frozen (its
+# executable is not a python), else the one running the manager, e.g. from a venv
+PYTHON_EXECUTABLE = "python.exe" if getattr(sys, 'frozen', False) else sys.executable
+
+# window: one top-level window (and process) per gadget
+# layer: gadgets run in-process in one desktop layer host, composited in one window per monitor
+PRESENTATION_MODES = ('window', 'layer')
+
+def synchronized(method):
+    """run the method holding self.lock"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
 # --- Key Step：make sure these dirs exist ---
 def ensure_gsf_dirs_exist():
     """Call when app started to make sure all necessary dirs has been created"""
@@ -28,9 +54,12 @@ def ensure_gsf_dirs_exist():
 def main():
     """Application entry point."""
     print("Starting Gadget System Framework (GSF)...")
+    trace = profiler.StartupTrace(origin=_PROCESS_START)
+    trace.mark('imports')
     # QApplication must be created here
-    app = QApplication(sys.argv)
-    manager = GadgetManager(app) # push app instance
+    with trace.phase('qapplication'):
+        app = QApplication(sys.argv)
+    manager = GadgetManager(app, trace) # push app instance
     sys.exit(manager.run())
 
 class GadgetManagerLogic:
@@ -38,45 +67,174 @@ class GadgetManagerLogic:
     GSF core logic controller，no any GUI
     which can be instance by service or any background threads safely
     """
-    def __init__(self):
+    def __init__(self, metrics_owner=False):
+        """
+        metrics_owner: this logic is the one of the manager process, it alone turn the
+        metrics on (and serve them) and export the poll counters, gauges and snapshot;
+        the other logics (control center, simulator) keep out of the shared metrics.json
+        """
         print("Initializing GadgetManagerLogic...")
+        from gsf import installer, blobstore
         ensure_gsf_dirs_exist()
         
         self.gadgets_dir = GADGETS_DIR
         self.session_file = SESSION_FILE
+        self.registry = installer.GadgetRegistry(INSTALLED_FILE)
+        self.blob_store = blobstore.BlobStore(BLOBS_DIR)
         self.running_gadgets = {}  # { 'gadget_id': subprocess.Popen object }
+        # the status poll run on a Timer thread and may restart gadgets while the UI launch others
+        self.lock = RLock()
+
+        self.presentation_mode = 'window'
+        self.layer_host = None     # subprocess.Popen of the desktop layer host, shared by its gadgets
+        self.layer_requests = {}   # { 'gadget_id': {'path', 'token'} }, see desktop_layer.LAYER_REQUEST_FILE
+
+        # hung gadgets are told apart from running ones by their heartbeats
+        self.watchdog = watchdog.Watchdog()
+        self.gadget_paths = {}     # { 'gadget_id': path }, of the launched gadgets, to restart them
+        self.not_responding = set()
+        self.last_health = {}      # { 'gadget_id': watchdog health }, of the running gadgets at the last poll
         
         # Timer for polling
         self.status_poll_timer = None
         self.on_status_change = None # callback，for notifying external changes
 
+        # counters/latencies of this manager, no-op unless enabled (gsf-metrics enable, GSF_METRICS=1)
+        self.metrics_owner = metrics_owner
+        if metrics_owner:
+            metrics.configure()
+
         self.load_session()
 
     def set_status_change_callback(self, callback):
         """setup a callback func, called when gadget status changed"""
         self.on_status_change = callback
-        self.start_polling()
+        # a logic shared by several windows is polled once
+        if self.status_poll_timer is None:
+            self.start_polling()
 
+    def notify_status_change(self):
+        metrics.inc('gsf_status_callbacks')
+        if self.on_status_change:
+            self.on_status_change()
+
+    @synchronized
     def start_polling(self):
         """Start check gadget process status"""
+        poll_start = time.perf_counter()
         # Check process whether exit accidently
         for gadget_id, process in list(self.running_gadgets.items()):
             if process.poll() is not None: # process has ended
-                print(f"Gadget '{gadget_id}' terminated unexpectedly.")
+                if process.returncode != 0:
+                    print(f"Gadget '{gadget_id}' terminated unexpectedly (exit code {process.returncode}).")
+                    metrics.inc('gsf_gadget_crashes')
+                else:
+                    # e.g. closed from its context menu
+                    print(f"Gadget '{gadget_id}' exited.")
+                    metrics.inc('gsf_gadget_exits')
                 del self.running_gadgets[gadget_id]
-                if self.on_status_change:
-                    self.on_status_change()
-        
+                layout.remove_rect(gadget_id)
+                self.watchdog.forget(gadget_id)
+                self.not_responding.discard(gadget_id)
+                if process is self.layer_host:
+                    self.remove_from_layer(gadget_id)
+                self.cancel_stale_profiling(gadget_id)
+                self.notify_status_change()
+
+        # gadgets closed by the user inside the desktop layer host
+        if self.layer_requests:
+            from gsf import desktop_layer
+            state = read_json(desktop_layer.LAYER_STATE_FILE, {})
+            for gadget_id, request in list(self.layer_requests.items()):
+                known = state.get(gadget_id)
+                if known and known['token'] == request['token'] and known['state'] == 'closed':
+                    print(f"Gadget '{gadget_id}' closed in the desktop layer.")
+                    self.remove_from_layer(gadget_id)
+                    self.running_gadgets.pop(gadget_id, None)
+                    self.watchdog.forget(gadget_id)
+                    layout.remove_rect(gadget_id)
+                    self.cancel_stale_profiling(gadget_id)
+                    self.notify_status_change()
+
+        if self.check_heartbeats():
+            self.notify_status_change()
+
+        if self.metrics_owner and metrics.REGISTRY.enabled:
+            metrics.inc('gsf_status_polls')
+            metrics.observe('gsf_status_poll_seconds', time.perf_counter() - poll_start)
+            metrics.set_gauge('gsf_running_gadgets', len(self.running_gadgets))
+            metrics.set_gauge('gsf_gadgets_not_responding', len(self.not_responding))
+            try:
+                metrics.REGISTRY.write_snapshot()
+            except OSError as e:
+                print(f"Cannot write the metrics snapshot: {e}")
+
         # check every 5 seconds
         self.status_poll_timer = Timer(5.0, self.start_polling)
         self.status_poll_timer.daemon = True # Make sure all threads exited when main app exits
         self.status_poll_timer.start()
 
+    def check_heartbeats(self):
+        """
+        mark the running gadgets which stopped sending heartbeats as not responding,
+        and restart them when the watchdog settings ask for it
+        Return: True if the status of a gadget changed
+        """
+        changed = False
+        last_health = {}
+        for gadget_id, process in list(self.get_running_gadgets_info().items()):
+            health = self.watchdog.health(gadget_id)
+            if health is None:
+                continue
+            last_health[gadget_id] = health
+            if health['status'] != watchdog.STATUS_NOT_RESPONDING:
+                if gadget_id in self.not_responding:
+                    print(f"Gadget '{gadget_id}' is responding again.")
+                    self.not_responding.discard(gadget_id)
+                    changed = True
+                continue
+
+            if gadget_id not in self.not_responding:
+                print(f"Gadget '{gadget_id}' is not responding, no heartbeat for {health['silent_for']:.0f}s.")
+                self.not_responding.add(gadget_id)
+                changed = True
+            # gadgets of the desktop layer share the host process, they can't be restarted alone
+            if process is not self.layer_host and self.watchdog.should_restart(gadget_id):
+                restarts = self.watchdog.restarts.get(gadget_id, 0) + 1
+                metrics.inc('gsf_gadget_restarts')
+                print(f"Restarting not responding gadget '{gadget_id}' ({restarts}/{self.watchdog.settings['max_restarts']}).")
+                self.terminate_gadget(gadget_id)
+                self.watchdog.restarts[gadget_id] = restarts
+                self.launch_gadget(self.gadget_paths[gadget_id], gadget_id)
+                changed = True
+        self.last_health = last_health
+        return changed
+
+    def get_gadget_health(self, gadget_id):
+        """
+        Return: None for a stopped gadget, else {'status': 'starting' | 'ok' | 'not_responding',
+        'silent_for': seconds, 'lag_ms': event loop lag {'count', 'p50', 'p90', 'p99', 'max'} or None}
+        """
+        if gadget_id not in self.get_running_gadgets_info():
+            return None
+        return self.watchdog.health(gadget_id)
+
+    def get_watchdog_options(self):
+        return dict(self.watchdog.settings)
+
+    def set_watchdog_options(self, **options):
+        """e.g. set_watchdog_options(timeout=10, restart=True), see watchdog.DEFAULT_SETTINGS"""
+        self.watchdog.settings.update(options)
+        watchdog.save_settings(options)
+
+    @metrics.timed('gsf_discovery_seconds')
     def discover_gadgets(self):
         """
         Scan gadgets dir and return a list which contain gadget information
         Return: [{'id': str, 'path': str, 'manifest': dict}, ...]
         """
+        from gsf import archive
+        metrics.inc('gsf_discovery_scans')
         discovered = []
         if not os.path.exists(self.gadgets_dir):
             return discovered
@@ -84,20 +242,153 @@ class GadgetManagerLogic:
         for name in sorted(os.listdir(self.gadgets_dir)):
             gadget_path = os.path.join(self.gadgets_dir, name)
             manifest_path = os.path.join(gadget_path, 'gadget.json')
+            gadget_id = name
+
+            # gadget installed as its package, manifest read from the archive
+            is_archive = archive.is_archive_gadget(gadget_path) and not name.startswith('.')
+            if is_archive:
+                gadget_id = os.path.splitext(name)[0]
             
-            if os.path.isdir(gadget_path) and os.path.exists(manifest_path):
+            if is_archive or (os.path.isdir(gadget_path) and os.path.exists(manifest_path)):
                 try:
-                    with open(manifest_path, 'r', encoding='utf-8') as f:
-                        manifest = json.load(f)
+                    manifest = self.get_manifest(gadget_path, gadget_id, save=False)
                     discovered.append({
-                        'id': name,
+                        'id': gadget_id,
                         'path': gadget_path,
                         'manifest': manifest
                     })
                 except Exception as e:
+                    metrics.inc('gsf_manifest_errors')
                     print(f"Error reading manifest for {name}: {e}")
+        # the manifests validated by this scan are written in one go
+        self.registry.save()
+        metrics.set_gauge('gsf_installed_gadgets', len(discovered))
         return discovered
 
+    def get_manifest(self, gadget_path, gadget_id, save=True):
+        """
+        return the validated manifest, from the install registry when gadget.json didn't change
+        gadgets copied by hand are validated once here and registered
+        save: False to batch the registry writes, the caller then call registry.save()
+        """
+        from gsf import installer
+        manifest = self.registry.get_manifest(gadget_id, gadget_path)
+        if manifest is None:
+            manifest = installer.load_manifest(gadget_path)
+            self.registry.add(gadget_id, gadget_path, manifest, save=save)
+        return manifest
+
+    def install_gadget(self, package_path, keep_archive=False):
+        """
+        validate, precompile and install a .zip gadget package, raise InstallError on failure
+        keep_archive: run the gadget from the .zip instead of extracting it
+        """
+        from gsf import installer
+        gadget_id = installer.install_package(package_path, self.gadgets_dir, self.registry,
+                                              keep_archive=keep_archive, blob_store=self.blob_store)
+        print(f"Installed gadget: {gadget_id}")
+        return gadget_id
+
+    def update_gadget(self, gadget_id, package_path):
+        """
+        update an installed gadget from a newer package, its settings and layout are kept
+        the new version is prepared while the gadget keep running, a running gadget is only
+        stopped for the swap and started again right after
+        Return: the update report, with 'bytes_written' and 'downtime_ms'
+        """
+        from gsf import installer
+        update = installer.prepare_update(package_path, self.gadgets_dir, blob_store=self.blob_store)
+        update['downtime_ms'] = 0.0
+        if update['gadget_id'] != gadget_id:
+            installer.discard_update(update, self.blob_store)
+            raise installer.InstallError(f"This package is the gadget {update['gadget_id']}, not {gadget_id}")
+        if installer.is_up_to_date(update):
+            installer.discard_update(update, self.blob_store)
+            print(f"Gadget {gadget_id} is already up to date")
+            return update
+
+        was_running = gadget_id in self.get_running_gadgets_info()
+        in_layer = was_running and self.running_gadgets.get(gadget_id) is self.layer_host
+        token = self.layer_requests.get(gadget_id, {}).get('token')
+        start = time.perf_counter()
+        try:
+            if was_running:
+                self.terminate_gadget(gadget_id)
+            # the host only drop the gadget at its next sync, its files are in use until then
+            if in_layer and not self.wait_layer_closed(gadget_id, token):
+                installer.discard_update(update, self.blob_store)
+                raise installer.InstallError(f"The desktop layer did not close {gadget_id}, update not applied")
+            installer.apply_update(update, self.registry, self.blob_store)
+        finally:
+            if was_running:
+                self.launch_gadget(update['target_path'], gadget_id)
+                # until the new process is spawned, its own start up come on top
+                update['downtime_ms'] = (time.perf_counter() - start) * 1000.0
+        print(f"Updated gadget {gadget_id} {update['old_version']} -> {update['new_version']}: "
+              f"{update['changed']} changed, {update['removed']} removed, {update['bytes_written']} bytes written, "
+              f"{update['downtime_ms']:.0f} ms downtime")
+        return update
+
+    def install_from_catalog(self, source, gadget_ids):
+        """
+        fetch gadgets from a repository (folder or http(s) url), verify them and install them
+        Return: [(gadget_id, installed gadget id or the exception which make it fail), ...]
+        """
+        from gsf import catalog
+        client = catalog.CatalogClient(source)
+        client.refresh()
+        results = client.install(gadget_ids, self.gadgets_dir, self.registry, self.blob_store)
+        for gadget_id, result in results:
+            if isinstance(result, Exception):
+                print(f"Cannot install {gadget_id} from the catalog: {result}")
+            else:
+                print(f"Installed gadget: {result}")
+        return results
+
+    def uninstall_gadget(self, gadget_id):
+        """remove an installed gadget, the gadget must be stopped before"""
+        from gsf import installer, archive, blobstore
+        if gadget_id in self.get_running_gadgets_info():
+            raise installer.InstallError("Please stop the gadget before uninstall it!")
+        archive_path = os.path.join(self.gadgets_dir, gadget_id + '.zip')
+        if archive.is_archive_gadget(archive_path):
+            os.remove(archive_path)
+            if os.path.exists(archive.archive_settings_file(archive_path)):
+                os.remove(archive.archive_settings_file(archive_path))
+        else:
+            blobstore.remove_tree(os.path.join(self.gadgets_dir, gadget_id))
+            freed = self.blob_store.release(gadget_id)
+            print(f"Freed {freed} bytes of shared gadget files")
+        self.registry.remove(gadget_id)
+        layout.forget(gadget_id)
+        print(f"Uninstalled gadget: {gadget_id}")
+
+    def auto_arrange(self, screens):
+        """
+        pack the running gadgets (the ones which published their rect), they move within a second
+        screens: available screen rects [(x, y, width, height), ...]
+        """
+        engine = layout.LayoutEngine.from_layout_dir(screens)
+        positions = engine.auto_arrange()
+        for gadget_id, pos in positions.items():
+            layout.request_move(gadget_id, pos)
+        print(f"Auto-arranged {len(positions)} gadgets")
+        return positions
+
+    def get_layout_options(self):
+        return layout.load_settings()
+
+    def set_layout_options(self, **options):
+        """e.g. set_layout_options(snap=True, no_overlap=True), see layout.DEFAULT_SETTINGS"""
+        layout.save_settings(options)
+
+    def get_storage_stats(self, collect=False):
+        """deduplication stats of the blob store, collect: gc unreferenced blobs first"""
+        if collect:
+            self.blob_store.gc(self.gadgets_dir)
+        return self.blob_store.stats()
+
+    @synchronized
     def get_running_gadgets_info(self):
         """return current running gadget information, for UI using"""
         # cleanup the ended process
@@ -107,39 +398,107 @@ class GadgetManagerLogic:
             if proc.pid in active_pids
         }
 
+    @synchronized
     def launch_gadget(self, gadget_path, gadget_id):
         """start a gadget sub-process"""
+        from gsf import archive
+        # only the launches which started a gadget are timed
+        start = time.perf_counter()
         if gadget_id in self.running_gadgets and self.running_gadgets[gadget_id].poll() is None:
             print(f"Gadget {gadget_id} is already running.")
             return
 
-        manifest_path = os.path.join(gadget_path, 'gadget.json')
         try:
-            with open(manifest_path, 'r', encoding='utf-8') as f:
-                manifest = json.load(f)
+            manifest = self.get_manifest(gadget_path, gadget_id)
         except Exception as e:
             print(f"Cannot launch {gadget_id}, manifest error: {e}")
+            metrics.inc('gsf_gadget_launch_failures', reason='manifest')
             return
         
-        entry_point = os.path.join(gadget_path, manifest.get('entry_point', 'main.py'))
+        entry_point = os.path.join(gadget_path, manifest['entry_point'])
         
-        if not os.path.exists(entry_point):
+        # entries of an archive are checked at install time
+        if not archive.is_archive_gadget(gadget_path) and not os.path.exists(entry_point):
             print(f"Error: Entry point not found for {gadget_id} at {entry_point}")
+            metrics.inc('gsf_gadget_launch_failures', reason='entry_point')
             return
 
-        # Use sys.executable to make sure use the current environment python interpreter
-        process = subprocess.Popen(["python.exe", entry_point, gadget_path])
+        # echoed by the heartbeats of this launch, whatever the pid of the gadget process
+        token = watchdog.new_launch_token()
+        if self.presentation_mode == 'layer':
+            process = self.launch_in_layer(gadget_path, gadget_id, token)
+        else:
+            # Use sys.executable to make sure use the current environment python interpreter
+            # run through gsf.launcher so the bytecode compiled at install time is used
+            process = subprocess.Popen([PYTHON_EXECUTABLE, "-m", "gsf.launcher", entry_point, gadget_path],
+                                       env=dict(os.environ, **{watchdog.LAUNCH_TOKEN_ENV: token}))
         self.running_gadgets[gadget_id] = process
+        self.gadget_paths[gadget_id] = gadget_path
+        self.watchdog.watch(gadget_id, token)
         print(f"Launched gadget: {gadget_id} with PID: {process.pid}")
+        metrics.inc('gsf_gadget_launches', mode=self.presentation_mode)
+        metrics.observe('gsf_gadget_launch_seconds', time.perf_counter() - start)
 
-        if self.on_status_change:
-            self.on_status_change()
+        self.notify_status_change()
 
+    def launch_in_layer(self, gadget_path, gadget_id, token):
+        """
+        ask the desktop layer host to run the gadget, start the host if needed
+        Return: the host process
+        """
+        from gsf import desktop_layer
+        # a new token tell the host it is a new launch, even if the user closed it before
+        self.layer_requests[gadget_id] = {'path': gadget_path, 'token': token}
+        desktop_layer.write_layer_request(self.layer_requests)
+        if self.layer_host is None or self.layer_host.poll() is not None:
+            self.layer_host = subprocess.Popen([PYTHON_EXECUTABLE, "-m", "gsf.desktop_layer"])
+            print(f"Started desktop layer host with PID: {self.layer_host.pid}")
+        return self.layer_host
+
+    def remove_from_layer(self, gadget_id):
+        """the host close the gadget at its next sync, and exit once it has none left"""
+        from gsf import desktop_layer
+        if self.layer_requests.pop(gadget_id, None) is not None:
+            desktop_layer.write_layer_request(self.layer_requests)
+
+    def wait_layer_closed(self, gadget_id, token, timeout=None):
+        """
+        wait until the host closed a gadget removed by remove_from_layer, it does at its next sync
+        Return: True once closed, False if the host still run it after timeout seconds
+        """
+        from gsf import desktop_layer
+        if timeout is None:
+            timeout = 3 * desktop_layer.SYNC_INTERVAL_MS / 1000.0
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.layer_host is None or self.layer_host.poll() is not None:
+                return True
+            # gone from the state once stopped, never there if the host didn't start it yet
+            known = read_json(desktop_layer.LAYER_STATE_FILE, {}).get(gadget_id)
+            if not known or known['token'] != token or known['state'] == 'closed':
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+
+    def set_presentation_mode(self, mode):
+        """apply to the gadgets started afterwards"""
+        if mode not in PRESENTATION_MODES:
+            raise ValueError(f"Unknown presentation mode '{mode}', choose from {PRESENTATION_MODES}")
+        self.presentation_mode = mode
+
+    @synchronized
     def terminate_gadget(self, gadget_id):
         """stop a gadget process"""
+        # only the terminations which stopped a gadget are timed
+        start = time.perf_counter()
         if gadget_id in self.running_gadgets:
             process = self.running_gadgets[gadget_id]
-            if process.poll() is None:
+            if process is self.layer_host:
+                # the host is shared, only this gadget has to go
+                self.remove_from_layer(gadget_id)
+                print(f"Removed gadget from the desktop layer: {gadget_id}")
+            elif process.poll() is None:
                 process.terminate()
                 try:
                     # wait most 3 seconds, timeout then continue
@@ -147,19 +506,52 @@ class GadgetManagerLogic:
                     print(f"Terminated gadget: {gadget_id}")
                 except subprocess.TimeoutExpired:
                     print(f"Gadget {gadget_id} did not terminate gracefully, killing.")
+                    metrics.inc('gsf_gadget_kills')
                     process.kill()
             
             del self.running_gadgets[gadget_id]
-            
-            if self.on_status_change:
-                self.on_status_change()
+            self.watchdog.forget(gadget_id)
+            self.not_responding.discard(gadget_id)
+            # killed processes don't run closeEvent
+            layout.remove_rect(gadget_id)
+            metrics.inc('gsf_gadget_terminations')
+            metrics.observe('gsf_gadget_terminate_seconds', time.perf_counter() - start)
+
+            self.cancel_stale_profiling(gadget_id)
+            self.notify_status_change()
         else:
             print(f"Cannot terminate: Gadget {gadget_id} not found in running list.")
 
+    def cancel_stale_profiling(self, gadget_id):
+        """a stopped gadget don't profile anymore, don't let its request profile the next launch"""
+        if profiler.is_profiling(gadget_id):
+            profiler.cancel_profiling(gadget_id)
+
+    def start_profiling(self, gadget_id, modes=profiler.PROFILE_MODES):
+        """
+        ask a running gadget to start its built-in profiler
+        Return: the dir where the gadget will write the results, None if not running
+        """
+        if gadget_id not in self.get_running_gadgets_info():
+            print(f"Cannot profile: Gadget {gadget_id} is not running.")
+            return None
+        profile_dir = profiler.request_profiling(gadget_id, modes)
+        print(f"Profiling requested for {gadget_id}: {list(modes)}")
+        return profile_dir
+
+    def stop_profiling(self, gadget_id):
+        """ask the gadget to stop profiling and dump its results"""
+        profile_dir = profiler.cancel_profiling(gadget_id)
+        print(f"Profiling stop requested for {gadget_id}")
+        return profile_dir
+
+    def is_profiling(self, gadget_id):
+        return profiler.is_profiling(gadget_id)
+
     def save_session(self):
         """save the session (current running gadget list) to file"""
         active_gadgets = list(self.get_running_gadgets_info().keys())
-        session_data = {"active_gadgets": active_gadgets}
+        session_data = {"active_gadgets": active_gadgets, "presentation_mode": self.presentation_mode}
         try:
             with open(self.session_file, 'w') as f:
                 json.dump(session_data, f, indent=4)
@@ -177,6 +569,7 @@ class GadgetManagerLogic:
                 session_data = json.load(f)
             
             print(f"Loading session, active gadgets: {session_data.get('active_gadgets', [])}")
+            self.presentation_mode = session_data.get('presentation_mode', 'window')
             all_gadgets = {g['id']: g['path'] for g in self.discover_gadgets()}
             for gadget_id in session_data.get("active_gadgets", []):
                 if gadget_id in all_gadgets:
@@ -199,28 +592,44 @@ class GadgetManagerLogic:
 
 
 class GadgetManager:
-    def __init__(self, app):
-        
-        ensure_gsf_dirs_exist()
+    def __init__(self, app, trace=None):
+        # every start up phase is timed, see profiler.STARTUP_TRACE_FILE
+        self.trace = trace if trace is not None else profiler.StartupTrace()
+
+        with self.trace.phase('dirs'):
+            ensure_gsf_dirs_exist()
         
         self.app = app
         # prevent app exit when no window
         self.app.setQuitOnLastWindowClosed(False)
 
-        os.makedirs(CONFIG_DIR, exist_ok=True)
+        # discovery, launches and the session go through the logic (created once the tray is up),
+        # so the tray run gadgets the same way as the service and the control center
+        self.logic = None
+        self.add_gadget_menu_stamp = None # mtime of GADGETS_DIR when the Add Gadget menu was filled
 
-        self.running_gadgets = {}  # { 'gadget_id': process_object }
+        with self.trace.phase('tray icon'):
+            self.tray_icon = QSystemTrayIcon()
+            self.tray_icon.setIcon(QIcon(DEFAULT_ICON))
+            self.tray_icon.setToolTip("Gadget System Framework")
+            self.tray_icon.setVisible(True)
+            self.tray_icon.activated.connect(self.on_tray_icon_activated)
 
-        self.tray_icon = QSystemTrayIcon()
-        self.tray_icon.setIcon(QIcon(DEFAULT_ICON))
-        self.tray_icon.setToolTip("Gadget System Framework")
-        self.tray_icon.setVisible(True)
-        self.tray_icon.activated.connect(self.on_tray_icon_activated)
-
-        self.setup_tray_menu()
-        self.load_session()
+        with self.trace.phase('tray menu'):
+            self.setup_tray_menu()
         
         self.control_center_window = None
+
+        # the rest is not needed to show the tray, it run once the event loop is up
+        QTimer.singleShot(0, self.deferred_startup)
+
+    def deferred_startup(self):
+        self.trace.mark('event loop running')
+        with self.trace.phase('session restore'):
+            # the tray is the manager process: it owns the metrics and polls the gadgets
+            self.logic = GadgetManagerLogic(metrics_owner=True)
+            self.logic.start_polling()
+        print(f"Startup trace written to {self.trace.write()}")
     
     def on_tray_icon_activated(self, reason):
         if reason == QSystemTrayIcon.DoubleClick:
@@ -231,8 +640,9 @@ class GadgetManager:
         open_center_action = menu.addAction("Open Control Center")
         open_center_action.triggered.connect(self.show_control_center)
         
+        # manifests are only scanned when the menu is about to open
         add_gadget_menu = menu.addMenu("Add Gadget")
-        self.discover_gadgets(add_gadget_menu)
+        add_gadget_menu.aboutToShow.connect(lambda: self.fill_add_gadget_menu(add_gadget_menu))
         
         menu.addSeparator()
         
@@ -241,102 +651,54 @@ class GadgetManager:
         
         self.tray_icon.setContextMenu(menu)
 
+    def fill_add_gadget_menu(self, menu):
+        """(re)build the Add Gadget menu, only when a gadget was installed or removed since last time"""
+        if self.logic is None:
+            return
+        stamp = os.stat(GADGETS_DIR).st_mtime_ns
+        if stamp == self.add_gadget_menu_stamp:
+            return
+        menu.clear()
+        self.discover_gadgets(menu)
+        self.add_gadget_menu_stamp = stamp
+
     def discover_gadgets(self, menu):
-        for name in os.listdir(GADGETS_DIR):
-            gadget_path = os.path.join(GADGETS_DIR, name)
-            manifest_path = os.path.join(gadget_path, 'gadget.json')
-            
-            if os.path.isdir(gadget_path) and os.path.exists(manifest_path):
-                with open(manifest_path, 'r', encoding='utf-8') as f:
-                    manifest = json.load(f)
-                
-                action = QAction(manifest.get('name', name), self.app)
-                action.triggered.connect(
-                    lambda checked=False, p=gadget_path, n=name: self.launch_gadget(p, n)
-                )
-                menu.addAction(action)
+        """one action per installed gadget, extracted or archive"""
+        for gadget in self.logic.discover_gadgets():
+            # owned by the menu, so menu.clear() delete it on rebuild
+            action = QAction(gadget['manifest'].get('name', gadget['id']), menu)
+            action.triggered.connect(
+                lambda checked=False, p=gadget['path'], n=gadget['id']: self.launch_gadget(p, n)
+            )
+            menu.addAction(action)
                 
     def show_control_center(self):
         """create and show control center window"""
+        if self.logic is None:
+            return
         if not self.control_center_window:
-            self.control_center_window = ControlCenter(GADGETS_DIR, self.running_gadgets)
-            # connect control center signal to manager
-            self.control_center_window.request_launch_gadget.connect(self.launch_gadget)
-            self.control_center_window.request_terminate_gadget.connect(self.terminate_gadget)
+            from gsf.control_center_logic import ControlCenter
+            # it show the gadgets of this process instead of starting a logic of its own
+            self.control_center_window = ControlCenter(self.logic)
             # when control center closed，make reference to None，to make it can recreate next time
-            self.control_center_window.setAttribute(Qt.WA_DeleteOnClose)
             self.control_center_window.destroyed.connect(lambda: setattr(self, 'control_center_window', None))
 
         self.control_center_window.show()
         self.control_center_window.activateWindow() # Activate window
 
     def launch_gadget(self, gadget_path, gadget_id):
-        if gadget_id in self.running_gadgets and self.running_gadgets[gadget_id].poll() is None:
-            print(f"Gadget {gadget_id} has already running。")
-            return
-
-        manifest_path = os.path.join(gadget_path, 'gadget.json')
-        with open(manifest_path, 'r', encoding='utf-8') as f:
-            manifest = json.load(f)
-        
-        entry_point = os.path.join(gadget_path, manifest['entry_point'])
-        
-        # Start gadget process，and press the dir as argument to it
-        process = subprocess.Popen([sys.executable, entry_point, gadget_path])
-        self.running_gadgets[gadget_id] = process
-        print(f"Running gadget: {gadget_id}")
-        
-        self.update_ui_status()
-
-    def save_session(self):
-        # only save the gadget process id list which are running
-        active_gadgets = [
-            gid for gid, proc in self.running_gadgets.items() if proc.poll() is None
-        ]
-        session_data = {"active_gadgets": active_gadgets}
-        with open(SESSION_FILE, 'w') as f:
-            json.dump(session_data, f)
-        print("session has been saved。")
-
-    def load_session(self):
-        if not os.path.exists(SESSION_FILE):
-            return
-        try:
-            with open(SESSION_FILE, 'r') as f:
-                session_data = json.load(f)
-            
-            for gadget_id in session_data.get("active_gadgets", []):
-                gadget_path = os.path.join(GADGETS_DIR, gadget_id)
-                if os.path.exists(gadget_path):
-                    self.launch_gadget(gadget_path, gadget_id)
-        except (json.JSONDecodeError, FileNotFoundError):
-            print("Cannot load the session file.")
+        self.logic.launch_gadget(gadget_path, gadget_id)
 
     def terminate_gadget(self, gadget_id):
         """stop specific gadget func"""
-        if gadget_id in self.running_gadgets:
-            process = self.running_gadgets[gadget_id]
-            if process.poll() is None: # process still running
-                process.terminate()
-                process.wait() # Wait process to end
-                print(f"Gadget has been stopped: {gadget_id}")
-            # remove from gadget dic
-            del self.running_gadgets[gadget_id]
-            # update UI
-            self.update_ui_status()
-
-    def update_ui_status(self):
-        """if control center opened，then update its status"""
-        if self.control_center_window:
-            self.control_center_window.update_status(self.running_gadgets)
+        self.logic.terminate_gadget(gadget_id)
 
     def quit_framework(self):
-        self.save_session()
-        
-        for gadget_id in list(self.running_gadgets.keys()):
-            self.terminate_gadget(gadget_id)
+        if self.logic is not None:
+            # save the session, then stop the gadgets
+            self.logic.quit_framework()
         
         self.app.quit()
 
     def run(self):
-        sys.exit(self.app.exec())
\ No newline at end of file
+        sys.exit(self.app.exec())
@@ -0,0 +1,300 @@
+import os
+import sys
+import time
+import argparse
+import threading
+import functools
+
+from gsf.appdata import APP_DATA_PATH, read_json, write_json_atomic
+
+SETTINGS_FILE = os.path.join(APP_DATA_PATH, 'config', 'metrics.json')
+# last snapshot of the manager, rewritten at every status poll
+SNAPSHOT_FILE = os.path.join(APP_DATA_PATH, 'metrics.json')
+DEFAULT_SETTINGS = {
+    'enabled': False,
+    'port': None,  # serve the OpenMetrics text on http://127.0.0.1:<port>/metrics
+}
+
+OPENMETRICS_CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+SUMMARY_QUANTILES = (0.5, 0.9, 0.99)
+
+# log-linear buckets: 2^5 sub-buckets per power of two, percentiles within ~3% of the exact value
+SUB_BUCKET_BITS = 5
+
+
+def load_settings(settings_file=SETTINGS_FILE):
+    settings = dict(DEFAULT_SETTINGS, **(read_json(settings_file) or {}))
+    # GSF_METRICS=1 switch it on for one run, without touching the settings
+    if os.getenv('GSF_METRICS'):
+        settings['enabled'] = os.getenv('GSF_METRICS') not in ('0', 'false')
+    return settings
+
+
+def save_settings(settings, settings_file=SETTINGS_FILE):
+    write_json_atomic(settings_file, dict(read_json(settings_file) or {}, **settings))
+
+
+class LatencyHistogram:
+    """
+    HDR-style histogram of durations in microseconds: log-linear buckets, so any value
+    from 1 us to hours is recorded in O(1) with a bounded relative error, sparse storage
+    """
+    def __init__(self):
+        self.counts = {}  # { bucket index: count }
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    @staticmethod
+    def _index(value):
+        # value >> shift keep SUB_BUCKET_BITS bits below the leading one: 32..63 once shifted,
+        # the values below 64 have their own bucket
+        shift = max(value.bit_length() - SUB_BUCKET_BITS - 1, 0)
+        return (shift << SUB_BUCKET_BITS) + (value >> shift)
+
+    @staticmethod
+    def _upper_bound(index):
+        shift = max((index >> SUB_BUCKET_BITS) - 1, 0)
+        if not shift:
+            return index
+        return ((index - (shift << SUB_BUCKET_BITS) + 1) << shift) - 1
+
+    def record(self, value_us):
+        value_us = max(int(value_us), 0)
+        index = self._index(value_us)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value_us
+        if self.min is None or value_us < self.min:
+            self.min = value_us
+        if self.max is None or value_us > self.max:
+            self.max = value_us
+
+    def percentile(self, pct):
+        if not self.count:
+            return None
+        target = self.count * pct / 100.0
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._upper_bound(index), self.max)
+        return self.max
+
+    def summary(self):
+        """Return: count, and the others in seconds"""
+        def seconds(value_us):
+            return value_us / 1e6 if value_us is not None else None
+        return {
+            'count': self.count,
+            'sum': seconds(self.total),
+            'min': seconds(self.min),
+            'max': seconds(self.max),
+            **{f"p{int(q * 100)}": seconds(self.percentile(q * 100)) for q in SUMMARY_QUANTILES},
+        }
+
+
+def _series(name, labels):
+    """name + sorted labels, the key of a time series"""
+    return (name, tuple(sorted(labels.items())))
+
+
+def _format_series(name, labels):
+    if not labels:
+        return name
+    escaped = ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels)
+    return f"{name}{{{escaped}}}"
+
+
+class MetricsRegistry:
+    """
+    counters, gauges and latency histograms of the manager, safe to update from any thread
+    every update is a no-op while disabled
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.counters = {}    # { (name, labels): number }
+        self.gauges = {}      # { (name, labels): number }
+        self.histograms = {}  # { (name, labels): LatencyHistogram }
+        self.server = None
+
+    def inc(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = _series(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set_gauge(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = _series(name, labels)
+        with self.lock:
+            self.gauges[key] = value
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        key = _series(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = LatencyHistogram()
+            histogram.record(seconds * 1e6)
+
+    def timed(self, name, **labels):
+        """decorator recording the duration of every call into the histogram `name`"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - start, **labels)
+            return wrapper
+        return decorator
+
+    def reset(self):
+        with self.lock:
+            self.counters, self.gauges, self.histograms = {}, {}, {}
+
+    def snapshot(self):
+        """Return: {'time', 'counters': {series: n}, 'gauges': {series: n}, 'histograms': {series: summary}}"""
+        with self.lock:
+            return {
+                'time': time.time(),
+                'counters': {_format_series(n, l): v for (n, l), v in sorted(self.counters.items())},
+                'gauges': {_format_series(n, l): v for (n, l), v in sorted(self.gauges.items())},
+                'histograms': {_format_series(n, l): h.summary() for (n, l), h in sorted(self.histograms.items())},
+            }
+
+    def to_openmetrics(self):
+        """OpenMetrics text exposition, histograms are exported as summaries"""
+        with self.lock:
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+            histograms = sorted((key, h.summary()) for key, h in self.histograms.items())
+
+        lines = []
+        declared = set()
+
+        def declare(name, metric_type):
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# TYPE {name} {metric_type}")
+
+        for (name, labels), value in counters:
+            declare(name, 'counter')
+            lines.append(f"{_format_series(name + '_total', labels)} {value}")
+        for (name, labels), value in gauges:
+            declare(name, 'gauge')
+            lines.append(f"{_format_series(name, labels)} {value}")
+        for (name, labels), summary in histograms:
+            declare(name, 'summary')
+            for q in SUMMARY_QUANTILES:
+                value = summary[f"p{int(q * 100)}"]
+                lines.append(f"{_format_series(name, labels + (('quantile', q),))} {value if value is not None else 'NaN'}")
+            lines.append(f"{_format_series(name + '_count', labels)} {summary['count']}")
+            lines.append(f"{_format_series(name + '_sum', labels)} {summary['sum']}")
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def write_snapshot(self, path=SNAPSHOT_FILE):
+        write_json_atomic(path, self.snapshot())
+        return path
+
+    def serve(self, port, host='127.0.0.1'):
+        """serve /metrics on a background thread, localhost only by default"""
+        # http.server is slow to import, most managers never serve
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.to_openmetrics().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', OPENMETRICS_CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        thread = threading.Thread(target=self.server.serve_forever, name="GSF_MetricsServer", daemon=True)
+        thread.start()
+        return self.server.server_address
+
+    def stop_serving(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+# the registry of this process, instrumented code use it through the shortcuts below
+REGISTRY = MetricsRegistry()
+inc = REGISTRY.inc
+set_gauge = REGISTRY.set_gauge
+observe = REGISTRY.observe
+timed = REGISTRY.timed
+
+
+def configure(settings=None):
+    """enable the registry (and its endpoint) as the metrics settings ask"""
+    settings = settings if settings is not None else load_settings()
+    REGISTRY.enabled = bool(settings['enabled'])
+    if REGISTRY.enabled and settings.get('port') and REGISTRY.server is None:
+        try:
+            host, port = REGISTRY.serve(int(settings['port']))
+            print(f"Serving metrics on http://{host}:{port}/metrics")
+        except OSError as e:
+            print(f"Cannot serve metrics on port {settings['port']}: {e}")
+    return REGISTRY.enabled
+
+
+def main(argv=None):
+    """gsf-metrics command line entry point"""
+    parser = argparse.ArgumentParser(prog='gsf-metrics', description="GSF manager metrics.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('show', help="print the last snapshot written by the manager")
+    enable_parser = sub.add_parser('enable', help="collect metrics from the next manager start")
+    enable_parser.add_argument('--port', type=int, help="also serve OpenMetrics on 127.0.0.1:PORT/metrics")
+    sub.add_parser('disable')
+    args = parser.parse_args(argv)
+
+    if args.command == 'enable':
+        save_settings({'enabled': True, 'port': args.port})
+        print("Metrics enabled, restart the manager to apply")
+        return 0
+    if args.command == 'disable':
+        save_settings({'enabled': False})
+        print("Metrics disabled, restart the manager to apply")
+        return 0
+
+    snapshot = read_json(SNAPSHOT_FILE)
+    if snapshot is None:
+        print(f"No snapshot in {SNAPSHOT_FILE}, are metrics enabled?")
+        return 1
+    print(f"Snapshot of {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(snapshot['time']))}")
+    for section in ('counters', 'gauges'):
+        for series, value in snapshot[section].items():
+            print(f"{series} {value}")
+    for series, summary in snapshot['histograms'].items():
+        print(f"{series} count {summary['count']}, p50 {summary['p50']} s, p99 {summary['p99']} s, max {summary['max']} s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
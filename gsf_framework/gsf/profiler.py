@@ -0,0 +1,330 @@
+import os
+import sys
+import time
+import bisect
+import cProfile
+import tracemalloc
+import argparse
+from contextlib import contextmanager
+
+from gsf.appdata import APP_DATA_PATH, read_json, write_json_atomic
+
+# every gadget get its own folder here, holding the control file and the results
+PROFILES_DIR = os.path.join(APP_DATA_PATH, 'profiles')
+CONTROL_FILE_NAME = 'control.json'
+
+# cpu: cProfile, memory: tracemalloc diff, timing: paint + event loop lag histograms
+PROFILE_MODES = ('cpu', 'memory', 'timing')
+
+# phases of the last start of the tray manager, also loadable in chrome://tracing / Perfetto
+STARTUP_TRACE_FILE = os.path.join(PROFILES_DIR, 'startup_trace.json')
+
+# bucket upper bounds in milliseconds, the last bucket catch everything bigger
+DEFAULT_BUCKETS_MS = (0.5, 1, 2, 4, 8, 16, 33, 50, 100, 250, 500, 1000, 5000)
+
+
+# process-wide, shared by the gadgets of the desktop layer host
+_cpu_profiler_owner = None   # gadget id, only one cProfile can be enabled at a time
+_tracemalloc_users = 0       # tracemalloc is stopped by the last one, if we started it
+_tracemalloc_started = False
+
+
+def _acquire_tracemalloc():
+    global _tracemalloc_users, _tracemalloc_started
+    if not _tracemalloc_users and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _tracemalloc_started = True
+    _tracemalloc_users += 1
+
+
+def _release_tracemalloc():
+    global _tracemalloc_users, _tracemalloc_started
+    _tracemalloc_users -= 1
+    if not _tracemalloc_users and _tracemalloc_started:
+        tracemalloc.stop()
+        _tracemalloc_started = False
+
+
+def get_profile_dir(gadget_id):
+    return os.path.join(PROFILES_DIR, gadget_id)
+
+
+class Histogram:
+    """
+    fixed log-scale buckets, cheap enough to record on every paint
+    percentiles are approximated by the bucket upper bound
+    """
+    def __init__(self, bounds=DEFAULT_BUCKETS_MS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, pct):
+        if not self.count:
+            return None
+        target = self.count * pct / 100.0
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if bucket_count and seen >= target:
+                # clamp to the real max, the last bucket has no upper bound
+                upper = self.bounds[index] if index < len(self.bounds) else self.max
+                return min(upper, self.max)
+        return self.max
+
+    def summary(self):
+        labels = [f"<={bound}" for bound in self.bounds] + [f">{self.bounds[-1]}"]
+        return {
+            'count': self.count,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.total / self.count if self.count else None,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'buckets': dict(zip(labels, self.counts)),
+        }
+
+
+class GadgetProfiler:
+    """
+    profiling agent living inside a gadget process
+    the manager switch it on/off by writing the control file, the gadget poll it
+    """
+    POLL_INTERVAL_MS = 1000
+    LOOP_LAG_INTERVAL_MS = 50
+
+    def __init__(self, gadget_id):
+        self.gadget_id = gadget_id
+        self.profile_dir = get_profile_dir(gadget_id)
+        self.control_file = os.path.join(self.profile_dir, CONTROL_FILE_NAME)
+        self.control_mtime = None
+
+        self.active_modes = set()
+        self.timing_enabled = False # checked on every event, keep it a plain attribute
+        self.cpu_profiler = None
+        self.memory_baseline = None
+        self.paint_histogram = None
+        self.loop_lag_histogram = None
+        self.started_at = None
+
+    def check_control(self):
+        """
+        re-read the control file only when it changed since the last poll
+        Return: True if the profiling state changed
+        """
+        try:
+            mtime = os.stat(self.control_file).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self.control_mtime:
+            return False
+        self.control_mtime = mtime
+
+        request = read_json(self.control_file, {}) if mtime is not None else {}
+        modes = set()
+        if request.get('active'):
+            modes = {m for m in request.get('modes', PROFILE_MODES) if m in PROFILE_MODES}
+        if modes == self.active_modes:
+            return False
+
+        if self.active_modes:
+            self.stop()
+        if modes:
+            self.start(modes)
+        return True
+
+    def start(self, modes):
+        global _cpu_profiler_owner
+        modes = set(modes)
+        if 'cpu' in modes and _cpu_profiler_owner not in (None, self.gadget_id):
+            print(f"Gadget '{self.gadget_id}' cannot profile cpu, '{_cpu_profiler_owner}' already does in this process")
+            modes.discard('cpu')
+        print(f"Gadget '{self.gadget_id}' start profiling: {sorted(modes)}")
+        self.active_modes = modes
+        self.started_at = time.time()
+
+        if 'memory' in modes:
+            _acquire_tracemalloc()
+            self.memory_baseline = tracemalloc.take_snapshot()
+        if 'timing' in modes:
+            self.paint_histogram = Histogram()
+            self.loop_lag_histogram = Histogram()
+            self.timing_enabled = True
+        # start cpu last, so the setup above does not show up in the profile
+        if 'cpu' in modes:
+            self.cpu_profiler = cProfile.Profile()
+            self.cpu_profiler.enable()
+            _cpu_profiler_owner = self.gadget_id
+
+    def stop(self):
+        """stop all running profilers and dump the results into the gadget profile dir"""
+        global _cpu_profiler_owner
+        if self.cpu_profiler:
+            self.cpu_profiler.disable()
+            _cpu_profiler_owner = None
+
+        os.makedirs(self.profile_dir, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        written = []
+
+        if self.cpu_profiler:
+            prof_path = os.path.join(self.profile_dir, f"cpu-{stamp}.prof")
+            self.cpu_profiler.dump_stats(prof_path)
+            with open(os.path.join(self.profile_dir, f"cpu-{stamp}.txt"), 'w', encoding='utf-8') as f:
+                # only needed here, kept out of the gadget and tray start up
+                import pstats
+                pstats.Stats(self.cpu_profiler, stream=f).sort_stats('cumulative').print_stats(50)
+            written.append(prof_path)
+            self.cpu_profiler = None
+
+        if self.memory_baseline is not None:
+            snapshot = tracemalloc.take_snapshot()
+            diff = snapshot.compare_to(self.memory_baseline, 'lineno')
+            current, peak = tracemalloc.get_traced_memory()
+            mem_path = os.path.join(self.profile_dir, f"memory-{stamp}.txt")
+            with open(mem_path, 'w', encoding='utf-8') as f:
+                f.write(f"traced current: {current} bytes, peak: {peak} bytes\n\n")
+                for stat in diff[:50]:
+                    f.write(f"{stat}\n")
+            written.append(mem_path)
+            self.memory_baseline = None
+            _release_tracemalloc()
+
+        if self.timing_enabled:
+            self.timing_enabled = False
+            timing_path = os.path.join(self.profile_dir, f"timing-{stamp}.json")
+            write_json_atomic(timing_path, {
+                'gadget_id': self.gadget_id,
+                'duration_s': time.time() - self.started_at,
+                'paint_ms': self.paint_histogram.summary(),
+                'event_loop_lag_ms': self.loop_lag_histogram.summary(),
+            })
+            written.append(timing_path)
+            self.paint_histogram = None
+            self.loop_lag_histogram = None
+
+        self.active_modes = set()
+        print(f"Gadget '{self.gadget_id}' profiling results: {written}")
+        return written
+
+    def record_paint(self, seconds):
+        self.paint_histogram.record(seconds * 1000.0)
+
+    def record_loop_lag(self, seconds):
+        self.loop_lag_histogram.record(max(0.0, seconds) * 1000.0)
+
+
+# --- manager side: start up trace of the tray manager ---
+class StartupTrace:
+    """
+    timestamps of the start up phases, relative to origin (a time.perf_counter() taken at
+    process entry, before the imports) or to the creation of the trace
+    with trace.phase('tray'): ...   /   trace.mark('tray visible')
+    """
+    def __init__(self, origin=None):
+        now = time.perf_counter()
+        self.origin = origin if origin is not None else now
+        self.started_at = time.time() - (now - self.origin)
+        self.phases = []  # (name, start ms, duration ms), duration None for marks
+
+    def _now_ms(self):
+        return (time.perf_counter() - self.origin) * 1000.0
+
+    @contextmanager
+    def phase(self, name):
+        start = self._now_ms()
+        try:
+            yield
+        finally:
+            self.phases.append((name, start, self._now_ms() - start))
+
+    def mark(self, name):
+        self.phases.append((name, self._now_ms(), None))
+
+    def write(self, path=STARTUP_TRACE_FILE):
+        pid = os.getpid()
+        events = [
+            {'name': name, 'ph': 'i', 's': 'p', 'ts': start * 1000.0, 'pid': pid, 'tid': 0} if duration is None else
+            {'name': name, 'ph': 'X', 'ts': start * 1000.0, 'dur': duration * 1000.0, 'pid': pid, 'tid': 0}
+            for name, start, duration in self.phases
+        ]
+        write_json_atomic(path, {
+            'started_at': self.started_at,
+            'total_ms': round(self._now_ms(), 3),
+            'phases': [
+                {'name': name, 'start_ms': round(start, 3), 'duration_ms': None if duration is None else round(duration, 3)}
+                for name, start, duration in self.phases
+            ],
+            'traceEvents': events,
+        })
+        return path
+
+
+# --- manager side: request/cancel profiling of a running gadget ---
+def request_profiling(gadget_id, modes=PROFILE_MODES):
+    modes = [m for m in modes if m in PROFILE_MODES]
+    if not modes:
+        raise ValueError(f"No valid profiling mode given, choose from {PROFILE_MODES}")
+    control_file = os.path.join(get_profile_dir(gadget_id), CONTROL_FILE_NAME)
+    write_json_atomic(control_file, {'active': True, 'modes': modes, 'requested_at': time.time()})
+    return get_profile_dir(gadget_id)
+
+
+def cancel_profiling(gadget_id):
+    control_file = os.path.join(get_profile_dir(gadget_id), CONTROL_FILE_NAME)
+    write_json_atomic(control_file, {'active': False, 'requested_at': time.time()})
+    return get_profile_dir(gadget_id)
+
+
+def is_profiling(gadget_id):
+    return bool(read_json(os.path.join(get_profile_dir(gadget_id), CONTROL_FILE_NAME), {}).get('active'))
+
+
+def list_results(gadget_id):
+    profile_dir = get_profile_dir(gadget_id)
+    if not os.path.isdir(profile_dir):
+        return []
+    return sorted(
+        os.path.join(profile_dir, name) for name in os.listdir(profile_dir)
+        if name != CONTROL_FILE_NAME and not name.endswith('.tmp')
+    )
+
+
+def main(argv=None):
+    """gsf-profile command line entry point"""
+    parser = argparse.ArgumentParser(prog='gsf-profile', description="Profile a running GSF gadget.")
+    parser.add_argument('command', choices=['start', 'stop', 'status'])
+    parser.add_argument('gadget_id')
+    parser.add_argument('--modes', default=','.join(PROFILE_MODES),
+                        help=f"comma separated list of {', '.join(PROFILE_MODES)}")
+    args = parser.parse_args(argv)
+
+    if args.command == 'start':
+        profile_dir = request_profiling(args.gadget_id, [m.strip() for m in args.modes.split(',')])
+        print(f"Profiling requested for '{args.gadget_id}', results will be written to {profile_dir}")
+    elif args.command == 'stop':
+        profile_dir = cancel_profiling(args.gadget_id)
+        print(f"Profiling stopped for '{args.gadget_id}', results in {profile_dir}")
+    else:
+        state = "active" if is_profiling(args.gadget_id) else "inactive"
+        print(f"Profiling for '{args.gadget_id}' is {state}")
+        for path in list_results(args.gadget_id):
+            print(f"  {path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """
+    in-memory substring search: every document is indexed by its trigrams,
+    a query term only verify the documents holding all the term trigrams
+    """
+    def __init__(self):
+        self.postings = {}  # { 'abc': {doc_id, ...} }
+        self.texts = {}     # { doc_id: lowercased searchable text }
+
+    def add(self, doc_id, *fields):
+        """
+        (re)index a document, cheap no-op when its text did not change
+        Return: True if the index changed
+        """
+        text = '\n'.join(str(field).lower() for field in fields if field)
+        if self.texts.get(doc_id) == text:
+            return False
+        self.remove(doc_id)
+        self.texts[doc_id] = text
+        for gram in trigrams(text):
+            self.postings.setdefault(gram, set()).add(doc_id)
+        return True
+
+    def remove(self, doc_id):
+        text = self.texts.pop(doc_id, None)
+        if text is None:
+            return False
+        for gram in trigrams(text):
+            docs = self.postings.get(gram)
+            if docs:
+                docs.discard(doc_id)
+                if not docs:
+                    del self.postings[gram]
+        return True
+
+    def _candidates(self, term, within):
+        if len(term) < 3:
+            # too short for trigrams, only a scan of the remaining documents
+            return set(within)
+        candidates = None
+        for gram in sorted(trigrams(term), key=lambda g: len(self.postings.get(g, ()))):
+            docs = self.postings.get(gram)
+            if not docs:
+                return set()
+            candidates = docs & within if candidates is None else candidates & docs
+            if not candidates:
+                break
+        return candidates
+
+    def search(self, query):
+        """
+        every whitespace separated term must be a substring of the document
+        Return: set of matching doc ids, all of them for an empty query
+        """
+        result = set(self.texts)
+        # longest terms first, they narrow the candidates the most
+        for term in sorted(query.lower().split(), key=len, reverse=True):
+            result = {doc_id for doc_id in self._candidates(term, result) if term in self.texts[doc_id]}
+            if not result:
+                break
+        return result
+
+    def __len__(self):
+        return len(self.texts)
+
+
+def sync_gadgets(index, gadgets):
+    """
+    bring the index in line with discover_gadgets() output, only the new, changed
+    and removed gadgets are touched
+    Return: number of documents added, updated or removed
+    """
+    changes = 0
+    seen = set()
+    for gadget in gadgets:
+        manifest = gadget['manifest']
+        seen.add(gadget['id'])
+        changes += index.add(gadget['id'], gadget['id'], manifest.get('name', ''), manifest.get('description', ''))
+    for doc_id in set(index.texts) - seen:
+        changes += index.remove(doc_id)
+    return changes
@@ -9,6 +9,7 @@ import sys
 import os
 import threading
 import subprocess
+import multiprocessing
 import logging
 from logging.handlers import RotatingFileHandler
 from PIL import Image
@@ -24,11 +25,10 @@ else:
     application_path = os.path.dirname(os.path.abspath(__file__))
     sys.path.insert(0, os.path.abspath(os.path.join(application_path, '..')))
 
-from gsf.main_manager import GadgetManagerLogic, ensure_gsf_dirs_exist, APP_DATA_PATH
+from gsf.main_manager import GadgetManagerLogic, ensure_gsf_dirs_exist
 from gsf.control_center_logic import ControlCenter
+from gsf.appdata import APP_DATA_PATH
 
-APP_NAME = "GSF"
-APP_DATA_PATH = os.path.join(os.getenv('APPDATA'), APP_NAME)
 GADGETS_DIR = os.path.join(APP_DATA_PATH, 'gadgets')
 
 LOG_FILE = os.path.join(APP_DATA_PATH, 'gsf_service.log')
@@ -108,7 +108,7 @@ class GSFService(win32serviceutil.ServiceFramework):
             logger.info("Directories checked/created.")
 
             logger.info("Initializing GadgetManagerLogic...")
-            self.manager_logic = GadgetManagerLogic()
+            self.manager_logic = GadgetManagerLogic(metrics_owner=True)
             logger.info("GadgetManagerLogic initialized successfully.")
 
             logger.info("Preparing to create tray icon...")
@@ -176,6 +176,8 @@ def run_control_center_ui():
         sys.exit(1)
 
 if __name__ == '__main__':
+    # the installer compile gadgets in a process pool, which re-launch this exe when frozen
+    multiprocessing.freeze_support()
     logger.info(f"Script launched with args: {sys.argv}")
 
     if len(sys.argv) == 1:
@@ -185,5 +187,21 @@ if __name__ == '__main__':
         if command == 'launch_ui':
             run_control_center_ui()
             sys.exit()
+        if command == 'profile':
+            # e.g. GSFService.exe profile start clock --modes cpu,timing
+            from gsf.profiler import main as profile_main
+            sys.exit(profile_main(sys.argv[2:]))
+        if command == 'install':
+            from gsf.installer import main as install_main
+            sys.exit(install_main(sys.argv[2:]))
+        if command == 'catalog':
+            from gsf.catalog import main as catalog_main
+            sys.exit(catalog_main(sys.argv[2:]))
+        if command == 'blobs':
+            from gsf.blobstore import main as blobs_main
+            sys.exit(blobs_main(sys.argv[2:]))
+        if command == 'metrics':
+            from gsf.metrics import main as metrics_main
+            sys.exit(metrics_main(sys.argv[2:]))
         
         win32serviceutil.HandleCommandLine(GSFService)
\ No newline at end of file
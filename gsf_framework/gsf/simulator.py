@@ -0,0 +1,273 @@
+import os
+import sys
+import json
+import time
+import zipfile
+import argparse
+import tempfile
+
+# gsf modules compute their data paths from APPDATA when imported, so the simulator
+# only import them in run(), once APPDATA point to its own throw-away data dir
+
+SIM_GADGET_SOURCE = '''import os
+import sys
+import json
+import time
+import random
+from PySide6.QtWidgets import QApplication
+from PySide6.QtGui import QPainter, QColor
+from PySide6.QtCore import QTimer
+
+from gsf.gadget_base import BaseGadget
+
+class SimGadget(BaseGadget):
+    """synthetic load: paint cost, repaint rate, memory footprint and random crashes"""
+    def __init__(self, gadget_path):
+        super().__init__(gadget_path)
+        with open(os.path.join(gadget_path, 'sim.json'), 'r', encoding='utf-8') as f:
+            self.params = json.load(f)
+        self.resize(120, 120)
+
+        # touch every page, an untouched allocation cost nothing
+        self.ballast = bytearray(int(self.params['memory_mb'] * 1024 * 1024))
+        for offset in range(0, len(self.ballast), 4096):
+            self.ballast[offset] = 1
+
+        self.crash_probability = self.params['crash_per_min'] / 60.0 / self.params['timer_hz']
+        self.frame_timer = QTimer(self)
+        self.frame_timer.timeout.connect(self.tick)
+        self.frame_timer.start(max(1, int(1000 / self.params['timer_hz'])))
+
+    def tick(self):
+        if random.random() < self.crash_probability:
+            # the simulator measure how long the manager take to notice
+            with open(os.path.join(self.params['crash_dir'], self.gadget_id), 'w') as f:
+                f.write(repr(time.time()))
+            os._exit(1)
+        self.update()
+
+    def paintEvent(self, event):
+        deadline = time.perf_counter() + self.params['paint_ms'] / 1000.0
+        while time.perf_counter() < deadline:
+            pass
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(0, 0, 0, 120))
+
+if __name__ == '__main__':
+    app = QApplication(sys.argv)
+    gadget = SimGadget(gadget_path=sys.argv[1])
+    gadget.show()
+    sys.exit(app.exec())
+'''
+
+DEFAULT_COUNTS = (10, 50, 100)
+
+
+def build_packages(count, params, packages_dir):
+    """Return: paths of `count` synthetic gadget packages"""
+    os.makedirs(packages_dir, exist_ok=True)
+    paths = []
+    for index in range(count):
+        gadget_id = f"sim{index:04d}"
+        path = os.path.join(packages_dir, gadget_id + '.zip')
+        with zipfile.ZipFile(path, 'w') as zip_ref:
+            zip_ref.writestr(f"{gadget_id}/gadget.json", json.dumps({
+                'name': f"Simulated gadget {index}",
+                'version': '1.0',
+                'description': 'synthetic load for gsf-simulate',
+                'entry_point': 'main.py',
+                'class': 'SimGadget',
+            }))
+            zip_ref.writestr(f"{gadget_id}/main.py", SIM_GADGET_SOURCE)
+            zip_ref.writestr(f"{gadget_id}/sim.json", json.dumps(params))
+        paths.append(path)
+    return paths
+
+
+def _rss_mb(pid='self'):
+    """resident memory of a process, None where /proc is not available"""
+    try:
+        with open(f"/proc/{pid}/status", 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return None
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100.0))]
+
+
+def run(counts=DEFAULT_COUNTS, params=None, duration=20.0, data_dir=None, startup_timeout=60.0):
+    """
+    install max(counts) synthetic gadgets, then for each N launch N of them through
+    GadgetManagerLogic, keep them running `duration` seconds while measuring, and stop them
+    Return: the scaling report, one dict per N
+    """
+    data_dir = data_dir or tempfile.mkdtemp(prefix='gsf-sim-')
+    crash_dir = os.path.join(data_dir, 'crashes')
+    os.makedirs(crash_dir, exist_ok=True)
+    params = dict(params or {}, crash_dir=crash_dir)
+
+    os.environ['APPDATA'] = data_dir
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    # the gadget processes import gsf too
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    os.environ['PYTHONPATH'] = os.pathsep.join(filter(None, [package_root, os.environ.get('PYTHONPATH')]))
+
+    from PySide6.QtWidgets import QApplication
+    from gsf import installer
+    from gsf.main_manager import GadgetManagerLogic
+    from gsf.control_center_logic import ControlCenter
+
+    app = QApplication.instance() or QApplication([sys.argv[0]])
+    logic = GadgetManagerLogic()
+
+    start = time.perf_counter()
+    results = installer.install_packages(
+        build_packages(max(counts), params, os.path.join(data_dir, 'packages')),
+        logic.gadgets_dir, logic.registry, blob_store=logic.blob_store)
+    install_ms = (time.perf_counter() - start) * 1000.0
+    failed = [result for _, result in results if isinstance(result, Exception)]
+    if failed:
+        raise RuntimeError(f"Cannot install the synthetic gadgets: {failed[0]}")
+    print(f"Installed {max(counts)} synthetic gadgets in {install_ms:.0f} ms")
+
+    # the Control Center show the logic of the simulator, it is refreshed by hand
+    control_center = ControlCenter(logic)
+
+    # how long a crash take to reach on_status_change
+    state = {'measuring': False, 'launched': set(), 'exited': set(), 'latencies': []}
+
+    def on_status_change():
+        if not state['measuring']:
+            return
+        now = time.time()
+        for gadget_id in state['launched'] - set(logic.running_gadgets) - state['exited']:
+            state['exited'].add(gadget_id)
+            try:
+                with open(os.path.join(crash_dir, gadget_id), 'r') as f:
+                    state['latencies'].append(now - float(f.read()))
+            except (OSError, ValueError):
+                pass
+
+    logic.set_status_change_callback(on_status_change)
+
+    report = []
+    for count in sorted(counts):
+        gadgets = logic.discover_gadgets()[:count]
+        for name in os.listdir(crash_dir):
+            os.remove(os.path.join(crash_dir, name))
+        state.update(launched={g['id'] for g in gadgets}, exited=set(), latencies=[])
+
+        start = time.perf_counter()
+        for gadget in gadgets:
+            logic.launch_gadget(gadget['path'], gadget['id'])
+        launch_ms = (time.perf_counter() - start) * 1000.0
+
+        # time to the first heartbeat of every gadget
+        startup = {}
+        deadline = time.perf_counter() + startup_timeout
+        while len(startup) < len(gadgets) and time.perf_counter() < deadline:
+            for gadget in gadgets:
+                health = logic.get_gadget_health(gadget['id'])
+                if gadget['id'] not in startup and health and health['status'] == 'ok':
+                    startup[gadget['id']] = time.perf_counter() - start
+            app.processEvents()
+            time.sleep(0.1)
+
+        state['measuring'] = True
+        refresh_ms = []
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        while time.perf_counter() - wall_start < duration:
+            refresh_start = time.perf_counter()
+            control_center.refresh_status()
+            refresh_ms.append((time.perf_counter() - refresh_start) * 1000.0)
+            app.processEvents()
+            time.sleep(1.0)
+        cpu_pct = (time.process_time() - cpu_start) / (time.perf_counter() - wall_start) * 100.0
+        state['measuring'] = False
+
+        running = logic.get_running_gadgets_info()
+        gadget_rss = [_rss_mb(process.pid) for process in running.values()]
+        lags = [health['lag_ms']['p99'] for health in (logic.get_gadget_health(gid) for gid in running)
+                if health and health['lag_ms'] and health['lag_ms']['count']]
+        row = {
+            'gadgets': count,
+            'launch_ms': round(launch_ms, 1),
+            'started': len(startup),
+            'startup_p50_s': _percentile(list(startup.values()), 50),
+            'startup_max_s': max(startup.values()) if startup else None,
+            'manager_cpu_pct': round(cpu_pct, 2),
+            'manager_rss_mb': _rss_mb(),
+            'gadgets_rss_mb': round(sum(gadget_rss), 1) if None not in gadget_rss else None,
+            'refresh_p50_ms': _percentile(refresh_ms, 50),
+            'refresh_max_ms': max(refresh_ms) if refresh_ms else None,
+            'crashes': len(os.listdir(crash_dir)),
+            'status_latency_p50_s': _percentile(state['latencies'], 50),
+            'status_latency_max_s': max(state['latencies']) if state['latencies'] else None,
+            # median over the gadgets of their own event loop lag p99
+            'gadget_lag_p99_ms': _percentile(lags, 50),
+        }
+
+        start = time.perf_counter()
+        for gadget_id in list(logic.running_gadgets):
+            logic.terminate_gadget(gadget_id)
+        row['terminate_ms'] = round((time.perf_counter() - start) * 1000.0, 1)
+        report.append(row)
+        print(_format_row(row))
+
+    if logic.status_poll_timer:
+        logic.status_poll_timer.cancel()
+    control_center.close()
+    return report
+
+
+def _format_row(row):
+    def fmt(value, spec):
+        return format(value, spec) if value is not None else '-'
+    return (f"N={row['gadgets']:<5} launch {fmt(row['launch_ms'], '.0f')} ms, "
+            f"started {row['started']}/{row['gadgets']} (p50 {fmt(row['startup_p50_s'], '.2f')} s), "
+            f"manager cpu {fmt(row['manager_cpu_pct'], '.1f')}% rss {fmt(row['manager_rss_mb'], '.0f')} MB, "
+            f"gadgets rss {fmt(row['gadgets_rss_mb'], '.0f')} MB, "
+            f"refresh p50 {fmt(row['refresh_p50_ms'], '.1f')} ms, "
+            f"{row['crashes']} crashes seen in p50 {fmt(row['status_latency_p50_s'], '.1f')} s, "
+            f"lag p99 {fmt(row['gadget_lag_p99_ms'], '.1f')} ms")
+
+
+def main(argv=None):
+    """gsf-simulate command line entry point"""
+    parser = argparse.ArgumentParser(prog='gsf-simulate',
+                                     description="Run N synthetic gadgets through the manager and report how it scales.")
+    parser.add_argument('--counts', default=','.join(map(str, DEFAULT_COUNTS)), help="fleet sizes, e.g. 10,50,100,500")
+    parser.add_argument('--duration', type=float, default=20.0, help="seconds measured per fleet size")
+    parser.add_argument('--paint-ms', type=float, default=2.0, help="cpu time spent by each paint")
+    parser.add_argument('--timer-hz', type=float, default=10.0, help="repaints per second")
+    parser.add_argument('--memory-mb', type=float, default=5.0, help="memory held by each gadget")
+    parser.add_argument('--crash-per-min', type=float, default=0.1, help="crash probability per gadget per minute")
+    parser.add_argument('--data-dir', help="throw-away GSF data dir, default: a new temp dir")
+    parser.add_argument('--report', help="write the report as JSON there")
+    args = parser.parse_args(argv)
+
+    params = {
+        'paint_ms': args.paint_ms,
+        'timer_hz': args.timer_hz,
+        'memory_mb': args.memory_mb,
+        'crash_per_min': args.crash_per_min,
+    }
+    counts = [int(count) for count in args.counts.split(',')]
+    report = run(counts, params, args.duration, args.data_dir)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump({'params': params, 'duration_s': args.duration, 'results': report}, f, indent=4)
+        print(f"Report written to {args.report}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+import os
+import time
+import uuid
+
+from gsf.profiler import Histogram
+from gsf.appdata import APP_DATA_PATH, read_json, write_json_atomic
+
+# every running gadget rewrite <id>.json here once per heartbeat
+HEARTBEATS_DIR = os.path.join(APP_DATA_PATH, 'heartbeats')
+SETTINGS_FILE = os.path.join(APP_DATA_PATH, 'config', 'watchdog.json')
+DEFAULT_SETTINGS = {
+    'timeout': 15.0,          # seconds without heartbeat before a gadget is not responding
+    'startup_timeout': 30.0,  # same, before its first heartbeat (python + Qt start up)
+    'restart': False,         # restart the gadgets which stopped responding
+    'max_restarts': 3,        # in a row, without a heartbeat in between
+}
+
+HEARTBEAT_INTERVAL_MS = 1000
+
+# set by the manager on every gadget process it launch, echoed in the heartbeats
+LAUNCH_TOKEN_ENV = 'GSF_LAUNCH_TOKEN'
+
+STATUS_STARTING = 'starting'
+STATUS_OK = 'ok'
+STATUS_NOT_RESPONDING = 'not_responding'
+
+
+def load_settings(settings_file=SETTINGS_FILE):
+    return dict(DEFAULT_SETTINGS, **(read_json(settings_file) or {}))
+
+
+def save_settings(settings, settings_file=SETTINGS_FILE):
+    write_json_atomic(settings_file, dict(load_settings(settings_file), **settings), indent=None)
+
+
+def new_launch_token():
+    return uuid.uuid4().hex
+
+
+def heartbeat_file(gadget_id, heartbeats_dir=HEARTBEATS_DIR):
+    return os.path.join(heartbeats_dir, f"{gadget_id}.json")
+
+
+class Heartbeat:
+    """
+    gadget side: beat() is called by a timer of the gadget event loop, a loop stuck in a
+    handler stop the heartbeats; how late the timer fire is recorded as the event loop lag
+    token: the launch token of the gadget, by default the one the manager put in its environment
+    """
+    def __init__(self, gadget_id, interval_ms=HEARTBEAT_INTERVAL_MS, heartbeats_dir=HEARTBEATS_DIR, token=None):
+        self.path = heartbeat_file(gadget_id, heartbeats_dir)
+        self.token = token if token is not None else os.getenv(LAUNCH_TOKEN_ENV)
+        self.interval_ms = interval_ms
+        self.lag_histogram = Histogram()
+        self.last_beat = None
+        self.seq = 0
+
+    def beat(self):
+        now = time.perf_counter()
+        if self.last_beat is not None:
+            self.lag_histogram.record(max(0.0, (now - self.last_beat) * 1000.0 - self.interval_ms))
+        self.last_beat = now
+        self.seq += 1
+        summary = self.lag_histogram.summary()
+        write_json_atomic(self.path, {
+            'pid': os.getpid(),
+            'token': self.token,
+            'seq': self.seq,
+            'time': time.time(),
+            'lag_ms': {key: summary[key] for key in ('count', 'p50', 'p90', 'p99', 'max')},
+        }, indent=None)
+
+    def stop(self):
+        """the gadget is closing, it is not hung"""
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class Watchdog:
+    """
+    manager side: tell from the heartbeat files whether the running gadgets still respond
+    heartbeats of a previous run of a gadget are told apart by the launch token, not the pid:
+    a launcher (py.exe, a venv redirector) may run the gadget in a child process
+    """
+    def __init__(self, settings=None, heartbeats_dir=HEARTBEATS_DIR):
+        self.settings = dict(DEFAULT_SETTINGS, **(settings if settings is not None else load_settings()))
+        self.heartbeats_dir = heartbeats_dir
+        self.watched = {}   # { 'gadget_id': (launch token, launch time) }
+        self.restarts = {}  # { 'gadget_id': restarts in a row }
+
+    def watch(self, gadget_id, token):
+        self.watched[gadget_id] = (token, time.time())
+
+    def forget(self, gadget_id):
+        self.watched.pop(gadget_id, None)
+
+    def read_heartbeat(self, gadget_id):
+        """Return: the last heartbeat of the current run of the gadget, None if there is none yet"""
+        watched = self.watched.get(gadget_id)
+        heartbeat = read_json(heartbeat_file(gadget_id, self.heartbeats_dir))
+        if watched is None or not heartbeat or heartbeat.get('token') != watched[0]:
+            return None
+        return heartbeat
+
+    def health(self, gadget_id, now=None):
+        """
+        Return: {'status': STATUS_*, 'silent_for': seconds since the last sign of life,
+                 'lag_ms': {'count', 'p50', 'p90', 'p99', 'max'} or None}
+        """
+        if gadget_id not in self.watched:
+            return None
+        now = now if now is not None else time.time()
+        heartbeat = self.read_heartbeat(gadget_id)
+        if heartbeat is None:
+            silent_for = now - self.watched[gadget_id][1]
+            status = STATUS_NOT_RESPONDING if silent_for > self.settings['startup_timeout'] else STATUS_STARTING
+            return {'status': status, 'silent_for': silent_for, 'lag_ms': None}
+        silent_for = now - heartbeat['time']
+        status = STATUS_NOT_RESPONDING if silent_for > self.settings['timeout'] else STATUS_OK
+        if status == STATUS_OK:
+            self.restarts.pop(gadget_id, None)
+        return {'status': status, 'silent_for': silent_for, 'lag_ms': heartbeat.get('lag_ms')}
+
+    def should_restart(self, gadget_id):
+        return self.settings['restart'] and self.restarts.get(gadget_id, 0) < self.settings['max_restarts']
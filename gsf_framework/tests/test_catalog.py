@@ -0,0 +1,45 @@
+import os
+import json
+
+import pytest
+
+from gsf.catalog import CatalogClient, CatalogError, parse_index
+
+
+def _index(gadget_id):
+    return json.dumps({'gadgets': [{'id': gadget_id, 'package': 'x.zip', 'sha256': '0' * 64}]})
+
+
+@pytest.mark.parametrize('gadget_id', ['../../x', '..', '.', 'a/b', 'a\\b', '/abs', 'C:x', ''])
+def test_parse_index_rejects_unsafe_ids(gadget_id):
+    with pytest.raises(CatalogError):
+        parse_index(_index(gadget_id))
+
+
+def test_parse_index_accepts_safe_ids():
+    assert list(parse_index(_index('clock-2.0_beta'))) == ['clock-2.0_beta']
+
+
+def test_traversal_id_is_not_fetched(tmp_path):
+    repo = tmp_path / 'repo'
+    repo.mkdir()
+    (repo / 'index.json').write_text(_index('../../escaped'))
+    client = CatalogClient(str(repo), cache_root=str(tmp_path / 'cache'))
+    with pytest.raises(CatalogError):
+        client.refresh()
+    # an entry forged after parsing can't leave the packages dir either
+    with pytest.raises(CatalogError):
+        client.cached_package_path({'id': '../../escaped'})
+    assert not any(name.startswith('escaped') for _, _, files in os.walk(tmp_path) for name in files)
+
+
+def test_corrupted_package_leaves_no_temp_file(tmp_path):
+    repo = tmp_path / 'repo'
+    repo.mkdir()
+    (repo / 'x.zip').write_bytes(b'not the expected package')
+    (repo / 'index.json').write_text(_index('clock'))
+    client = CatalogClient(str(repo), cache_root=str(tmp_path / 'cache'))
+    with pytest.raises(CatalogError):
+        client.fetch_package(client.get_entry('clock'))
+    assert os.listdir(client.packages_dir) == []
+    assert sorted(os.listdir(client.cache_dir)) == ['index.json', 'index.meta.json', 'packages']
@@ -0,0 +1,28 @@
+import random
+
+from gsf.metrics import SUB_BUCKET_BITS, LatencyHistogram
+
+
+def test_buckets_are_contiguous_and_cover_their_values():
+    previous = -1
+    for value in range(1 << 16):
+        index = LatencyHistogram._index(value)
+        assert index in (previous, previous + 1)
+        assert value <= LatencyHistogram._upper_bound(index)
+        previous = index
+
+
+def test_sub_buckets_per_power_of_two():
+    indexes = {LatencyHistogram._index(value) for value in range(1 << 20, 1 << 21)}
+    assert len(indexes) == 1 << SUB_BUCKET_BITS
+
+
+def test_percentiles_within_bucket_error():
+    rng = random.Random(0)
+    values = sorted(int(rng.lognormvariate(9, 1.5)) for _ in range(50000))
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+    for pct in (50, 90, 99, 99.9):
+        exact = values[int(len(values) * pct / 100.0) - 1]
+        assert abs(histogram.percentile(pct) - exact) <= exact / (1 << SUB_BUCKET_BITS) + 1
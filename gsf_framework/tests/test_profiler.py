@@ -0,0 +1,34 @@
+import tracemalloc
+
+from gsf import profiler
+from gsf.profiler import GadgetProfiler
+
+
+def _profiler(tmp_path, monkeypatch, gadget_id):
+    monkeypatch.setattr(profiler, 'PROFILES_DIR', str(tmp_path))
+    return GadgetProfiler(gadget_id)
+
+
+def test_gadgets_of_one_process_share_tracemalloc(tmp_path, monkeypatch):
+    first = _profiler(tmp_path, monkeypatch, 'clock')
+    second = _profiler(tmp_path, monkeypatch, 'weather')
+    first.start({'memory'})
+    second.start({'memory'})
+    first.stop()
+    assert tracemalloc.is_tracing()
+    # the snapshot of the second gadget still works
+    assert any(path.startswith(str(tmp_path / 'weather' / 'memory-')) for path in second.stop())
+    assert not tracemalloc.is_tracing()
+
+
+def test_only_one_gadget_profile_cpu_at_a_time(tmp_path, monkeypatch):
+    first = _profiler(tmp_path, monkeypatch, 'clock')
+    second = _profiler(tmp_path, monkeypatch, 'weather')
+    first.start({'cpu'})
+    second.start({'cpu', 'timing'})
+    assert second.active_modes == {'timing'}
+    second.stop()
+    first.stop()
+    second.start({'cpu'})
+    assert second.active_modes == {'cpu'}
+    second.stop()
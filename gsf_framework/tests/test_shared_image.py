@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+QtGui = pytest.importorskip('PySide6.QtGui')
+from PySide6.QtCore import QBuffer, QByteArray, QIODevice
+from PySide6.QtGui import QColor, QImage, QPainter
+from PySide6.QtWidgets import QApplication
+
+from gsf.asset_cache import AssetCache
+from gsf.gadget_base import _decode_image, _wrap_shared_pixels
+
+
+@pytest.fixture(scope='module')
+def app():
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    return QApplication.instance() or QApplication([])
+
+
+def _png(color):
+    image = QImage(4, 4, QImage.Format_ARGB32)
+    image.fill(QColor(color))
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.WriteOnly)
+    image.save(buffer, 'PNG')
+    return bytes(data)
+
+
+def test_writes_detach_from_the_read_only_segment(app, tmp_path):
+    cache = AssetCache(str(tmp_path))
+    asset = cache.acquire(_png('#102030'), _decode_image, QImage.Format_ARGB32_Premultiplied.value)
+    held = _wrap_shared_pixels(asset)
+    image = QImage(held)
+
+    target = QImage(8, 8, QImage.Format_ARGB32_Premultiplied)
+    painter = QPainter(target)
+    painter.drawImage(0, 0, image)
+    painter.end()
+    assert image.cacheKey() == held.cacheKey()  # painting did not copy
+
+    image.setPixelColor(0, 0, QColor('red'))
+    painter = QPainter(image)
+    painter.fillRect(1, 1, 2, 2, QColor('blue'))
+    painter.end()
+    assert image.cacheKey() != held.cacheKey()
+    assert image.pixelColor(0, 0) == QColor('red')
+    assert held.pixelColor(0, 0) == QColor('#102030')
+
+    del image, held
+    cache.release(asset)
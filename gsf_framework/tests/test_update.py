@@ -0,0 +1,87 @@
+import os
+import json
+import stat
+import zipfile
+
+from gsf import installer
+from gsf.blobstore import BlobStore
+
+
+def _package(directory, version, main_source):
+    path = os.path.join(directory, f'demo-{version}', 'demo.zip')
+    os.makedirs(os.path.dirname(path))
+    with zipfile.ZipFile(path, 'w') as zip_ref:
+        zip_ref.writestr('demo/gadget.json', json.dumps({
+            'name': 'Demo', 'version': version, 'description': '', 'entry_point': 'main.py'}))
+        zip_ref.writestr('demo/main.py', main_source)
+        zip_ref.writestr('demo/assets/data.txt', 'unchanged asset')
+    return path
+
+
+def _install(tmp_path):
+    gadgets_dir = str(tmp_path / 'gadgets')
+    registry = installer.GadgetRegistry(str(tmp_path / 'installed.json'))
+    store = BlobStore(str(tmp_path / 'blobs'))
+    installer.install_package(_package(str(tmp_path), '1.0', 'print(1)\n'), gadgets_dir, registry, blob_store=store)
+    return gadgets_dir, registry, store
+
+
+def test_update_is_applied_when_the_old_folder_cannot_be_removed(tmp_path, monkeypatch):
+    gadgets_dir, registry, store = _install(tmp_path)
+    update = installer.prepare_update(_package(str(tmp_path), '2.0', 'print(2)\n'), gadgets_dir, blob_store=store)
+
+    real_remove_tree = installer.remove_tree
+
+    def remove_tree(path):
+        if os.path.isdir(os.path.join(path, '.previous')):
+            raise PermissionError(f"{path} is in use")
+        real_remove_tree(path)
+    monkeypatch.setattr(installer, 'remove_tree', remove_tree)
+    installer.apply_update(update, registry, store)
+
+    assert installer.load_manifest(os.path.join(gadgets_dir, 'demo'))['version'] == '2.0'
+    assert registry.entries['demo']['manifest']['version'] == '2.0'
+    store.load()
+    assert len(store.gadgets['demo']) == 2 and '.update-demo' not in store.gadgets
+    assert os.path.isdir(update['staging_dir'])
+
+    # the leftover is removed by the next update
+    monkeypatch.setattr(installer, 'remove_tree', real_remove_tree)
+    update = installer.prepare_update(_package(str(tmp_path), '3.0', 'print(3)\n'), gadgets_dir, blob_store=store)
+    installer.discard_update(update, store)
+    assert [name for name in os.listdir(gadgets_dir) if name.startswith('.update-')] == []
+
+
+def test_update_keeps_the_links_of_unchanged_files(tmp_path, monkeypatch):
+    gadgets_dir, registry, store = _install(tmp_path)
+    real_remove = os.remove
+
+    def remove(path, *args, **kwargs):
+        # as on windows: read-only files cannot be deleted
+        if not os.stat(path).st_mode & stat.S_IWUSR:
+            raise PermissionError(f"{path} is read-only")
+        real_remove(path, *args, **kwargs)
+    monkeypatch.setattr(os, 'remove', remove)
+
+    update = installer.prepare_update(_package(str(tmp_path), '2.0', 'print(2)\n'), gadgets_dir, blob_store=store)
+    asset = os.path.join(update['staged_path'], 'assets', 'data.txt')
+    assert os.path.samefile(asset, os.path.join(gadgets_dir, 'demo', 'assets', 'data.txt'))
+    installer.apply_update(update, registry, store)
+    store.load()
+    assert store.blobs[store.gadgets['demo'][0]]['refs'] >= 1
+
+
+def test_gc_keeps_the_files_of_a_pending_update(tmp_path):
+    gadgets_dir, registry, store = _install(tmp_path)
+    update = installer.prepare_update(_package(str(tmp_path), '2.0', 'print(2)\n'), gadgets_dir, blob_store=store)
+    store.gc(gadgets_dir)
+    assert '.update-demo' in store.gadgets
+    installer.apply_update(update, registry, store)
+    store.gc(gadgets_dir)
+    assert set(store.gadgets) == {'demo'}
+
+    # a staged copy which is gone (e.g. a crash and a manual cleanup) does not keep its files
+    update = installer.prepare_update(_package(str(tmp_path), '3.0', 'print(3)\n'), gadgets_dir, blob_store=store)
+    installer.remove_tree(update['staging_dir'])
+    store.gc(gadgets_dir)
+    assert set(store.gadgets) == {'demo'}